@@ -1,9 +1,12 @@
 import datetime
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
 from json import dumps, loads
 
-import requests
 from flask import (
     Flask,
     Response,
@@ -14,19 +17,156 @@ from flask import (
     render_template,
     request,
     session,
+    stream_with_context,
 )
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import health
+import metrics
+import sse
+import uploads
+from cache import CACHE_DIR, SingleFlight, cache_stats, new_cache, private_dir
 
 from app_helper import (
     JURISDICTIONS,
+    abort_response,
     api_request,
+    api_url,
+    fan_out,
     format_summary,
     generate_source_context,
+    get_client,
+    iter_fan_out,
+    iter_zip,
     logger,
     organize_sources,
 )
 
 app = Flask(__name__)
 app.secret_key = os.environ["FLASK_SECRET_KEY"]
+metrics.init_app(app)
+
+# Compiled templates on disk, so a new worker loads them instead of compiling.
+# Entries are keyed by the template source, so a changed template is recompiled.
+# It loads marshalled code, so it is only used in a directory private to this user.
+JINJA_CACHE_DIR = os.path.join(CACHE_DIR, "jinja")
+try:
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(private_dir(JINJA_CACHE_DIR))
+except OSError:
+    logger.warning("Template bytecode cache is off: %s is not private.", JINJA_CACHE_DIR, exc_info=True)
+# Compile every template at import. With preload_app the master does it once
+# and the workers share the compiled templates.
+PRECOMPILE_TEMPLATES = os.environ.get("OPB_PRECOMPILE_TEMPLATES", "false").lower() in ("1", "true", "yes")
+
+
+def precompile_templates():
+    """Compile every template now, so the first request to use one doesn't wait for it."""
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+
+SESSIONS_CONCURRENCY = int(os.environ.get("OPB_SESSIONS_CONCURRENCY", 8))
+SESSIONS_DEADLINE = float(os.environ.get("OPB_SESSIONS_DEADLINE", 15))
+# Upstream endpoint that looks up many sessions in one call. Until the API
+# has it, a 404/405 switches this worker to per-session fetches, and the
+# endpoint is tried again after OPB_BATCH_SESSIONS_RECHECK seconds.
+BATCH_SESSIONS_ENDPOINT = os.environ.get("OPB_BATCH_SESSIONS_ENDPOINT", "fetch_sessions_batch")
+BATCH_SESSIONS_RECHECK = float(os.environ.get("OPB_BATCH_SESSIONS_RECHECK", 300))
+batch_sessions_unavailable_until = 0.0
+EXPORT_CONCURRENCY = int(os.environ.get("OPB_EXPORT_CONCURRENCY", 8))
+EXPORT_DEADLINE = float(os.environ.get("OPB_EXPORT_DEADLINE", 120))
+# Streamed (ndjson/zip) exports have no total deadline, only this limit per session
+EXPORT_SESSION_TIMEOUT = float(os.environ.get("OPB_EXPORT_SESSION_TIMEOUT", 60))
+
+# Each user's bot map from view_bots, dropped when they create or delete a bot.
+# Both bot caches are on disk by default so that drop reaches every worker; with
+# OPB_BOTS_CACHE_BACKEND=memory other workers serve stale bots for up to the TTL.
+BOTS_CACHE_BACKEND = os.environ.get("OPB_BOTS_CACHE_BACKEND", "sqlite")
+bots_cache = new_cache(
+    "bots",
+    ttl=float(os.environ.get("OPB_BOTS_CACHE_TTL", 30)),
+    max_entries=int(os.environ.get("OPB_BOTS_CACHE_MAX_ENTRIES", 1000)),
+    backend=BOTS_CACHE_BACKEND,
+)
+
+
+def fetch_user_bots(id_token, user):
+    """Return the user's bots keyed by bot ID, from the cache when possible."""
+    uid = user.get("firebase_uid")
+    bots = bots_cache.get(uid) if uid else None
+    if bots is not None:
+        return bots
+    with api_request("view_bots", method="POST", data={"user": user}, id_token=id_token) as r:
+        r.raise_for_status()
+        response_data = r.json()
+    if response_data.get("message") != "Success" or "data" not in response_data:
+        return {}
+    bots = response_data["data"]
+    if uid:
+        bots_cache.set(uid, bots)
+    return bots
+
+
+# Bot configurations from view_bot, keyed by (bot ID, user). Expired entries
+# are kept so they can be revalidated with a conditional request.
+bot_cache = new_cache(
+    "bot_configs",
+    ttl=float(os.environ.get("OPB_BOT_CACHE_TTL", 300)),
+    max_entries=int(os.environ.get("OPB_BOT_CACHE_MAX_ENTRIES", 1000)),
+    keep_stale=True,
+    backend=BOTS_CACHE_BACKEND,
+)
+
+
+def fetch_bot(bot_id, id_token, user):
+    """Return the view_bot response for a bot, from the cache when possible."""
+    key = (bot_id, user.get("firebase_uid"))
+    cached = bot_cache.get(key)
+    if cached is not None:
+        return cached["result"]
+    stale = bot_cache.get_stale(key)
+    headers = {}
+    if stale and stale["etag"]:
+        headers["If-None-Match"] = stale["etag"]
+    if stale and stale["last_modified"]:
+        headers["If-Modified-Since"] = stale["last_modified"]
+    params = {"bot_id": bot_id, "user": user}
+    with api_request("view_bot", method="POST", id_token=id_token, params=params, headers=headers) as r:
+        if r.status_code == 304 and stale:
+            bot_cache.set(key, stale)
+            return stale["result"]
+        r.raise_for_status()
+        result = r.json()
+        etag = r.headers.get("ETag")
+        last_modified = r.headers.get("Last-Modified")
+    if result.get("data") is not None:
+        bot_cache.set(key, {"result": result, "etag": etag, "last_modified": last_modified})
+    return result
+
+
+# Rendered search results per user, so a repeated query skips the search call.
+# The user is part of the key because the API checks their access to the collection.
+search_cache = new_cache(
+    "search",
+    ttl=float(os.environ.get("OPB_SEARCH_CACHE_TTL", 600)),
+    max_bytes=int(os.environ.get("OPB_SEARCH_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+)
+
+
+def normalize_query(text):
+    return " ".join(text.split()).lower() if text else ""
+
+
+def search_cache_key(data):
+    return (
+        data["user"]["firebase_uid"],
+        data["collection"],
+        normalize_query(data["query"]),
+        normalize_query(data.get("keyword_query")),
+        tuple(sorted(data.get("jurisdictions", []))),
+        data.get("after_date"),
+        data.get("before_date"),
+    )
 
 
 @app.route("/")
@@ -89,34 +229,30 @@ def agents():
     # If user is authenticated, fetch real agent data
     if id_token:
         try:
-            with api_request("view_bots", method="POST", data={"user": user}, id_token=id_token) as r:
-                if r.status_code == 200:
-                    response_data = r.json()
-                    if response_data.get("message") == "Success" and "data" in response_data:
-                        # Transform the API response to match the expected format for the template
-                        for bot_id, bot in response_data["data"].items():
-                            # Count total tools (search_tools + vdb_tools)
-                            search_tools = bot.get("search_tools", [])
-                            vdb_tools = bot.get("vdb_tools", [])
-                            total_tools = len(search_tools) + len(vdb_tools)
-
-                            # Count resources (assuming vdb_tools represent resources)
-                            resources = len(vdb_tools)
-
-                            # Determine if bot is dynamic (has search tools)
-                            is_dynamic = len(search_tools) > 0
-
-                            agent = {
-                                "id": bot_id,
-                                "name": bot.get("name", "Untitled Bot"),
-                                "created_on": datetime.datetime.fromisoformat(bot.get("created_at", datetime.datetime.now().isoformat())).date() if bot.get("created_at") else datetime.date.today(),
-                                "tools": total_tools,
-                                "resources": resources,
-                                "dynamic": is_dynamic
-                            }
-                            agents.append(agent)
-                else:
-                    logger.error(f"Failed to fetch agents: {r.status_code} - {r.text}")
+            # Transform the API response to match the expected format for the template
+            for bot_id, bot in fetch_user_bots(id_token, user).items():
+                # Count total tools (search_tools + vdb_tools)
+                search_tools = bot.get("search_tools", [])
+                vdb_tools = bot.get("vdb_tools", [])
+                total_tools = len(search_tools) + len(vdb_tools)
+
+                # Count resources (assuming vdb_tools represent resources)
+                resources = len(vdb_tools)
+
+                # Determine if bot is dynamic (has search tools)
+                is_dynamic = len(search_tools) > 0
+
+                agent = {
+                    "id": bot_id,
+                    "name": bot.get("name", "Untitled Bot"),
+                    "created_on": datetime.datetime.fromisoformat(bot.get("created_at", datetime.datetime.now().isoformat())).date() if bot.get("created_at") else datetime.date.today(),
+                    "tools": total_tools,
+                    "resources": resources,
+                    "dynamic": is_dynamic
+                }
+                agents.append(agent)
+        except health.UpstreamUnavailable:
+            raise
         except Exception:
             logger.exception("Error fetching agents.")
 
@@ -158,16 +294,15 @@ def resources():
 @app.route("/agent/<agent>/session/<session_id>", methods=["GET"])
 def chatbot(agent, session_id=None):
     user = {"firebase_uid": session.get("firebase_uid"), "email": session.get("email")}
-    data = {"bot_id": agent, "user": user}
     logger.info("Fetching agent info for ID %s", agent)
     id_token = session.get("id_token")
     if not id_token:
         return redirect("/signup")
 
     try:
-        with api_request("view_bot", method="POST", id_token=id_token, params=data) as r:
-            r.raise_for_status()
-            result = r.json()
+        result = fetch_bot(agent, id_token, user)
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Fetch agent info failed.")
         return jsonify({"error": "Failed to load agent."}), 400
@@ -220,6 +355,49 @@ def users():
     return render_template("users.html", users=example_data, user=user)
 
 
+# Upload results by the file's SHA-256, so a file attached again is not re-sent and
+# re-indexed. Scoped to the chat session, or with OPB_UPLOAD_DEDUP_SCOPE=user to all of
+# the user's sessions (for an API that indexes uploads per user). On disk by default,
+# since the check and the upload may land on different workers.
+UPLOAD_DEDUP_SCOPE = os.environ.get("OPB_UPLOAD_DEDUP_SCOPE", "session")
+uploads_cache = new_cache(
+    "uploads",
+    ttl=float(os.environ.get("OPB_UPLOAD_DEDUP_TTL", 24 * 3600)),
+    max_entries=int(os.environ.get("OPB_UPLOAD_DEDUP_MAX_ENTRIES", 10000)),
+    backend=os.environ.get("OPB_UPLOAD_DEDUP_BACKEND", "sqlite"),
+)
+
+
+def upload_key(uid, session_id, digest):
+    return (uid, None if UPLOAD_DEDUP_SCOPE == "user" else session_id, digest)
+
+
+def upload_file(id_token, session_id, fields, body, content_type):
+    """Send one streamed file to upload_files. The session id may also come as a form field."""
+    with api_request(
+        "upload_files",
+        id_token=id_token,
+        params={"session_id": session_id or fields.get("sessionId")},
+        body=body,
+        headers={"Content-Type": content_type},
+    ) as r:
+        r.raise_for_status()
+        return r.json()
+
+
+def open_chat_stream(request_data, id_token, user):
+    """Start an upstream chat stream and register it so a dropped browser can resume it."""
+    r = api_request("chat_session_stream", id_token=id_token, data=request_data, stream=True)
+    try:
+        r.raise_for_status()
+    except Exception:
+        r.close()
+        raise
+    return sse.streams.open(
+        r.iter_lines(), close=partial(abort_response, r), session_id=request_data["session_id"], uid=user["firebase_uid"]
+    )
+
+
 @app.route("/chat", methods=["GET", "POST"])
 def chat():
     logger.info("Chat endpoint called.")
@@ -229,34 +407,43 @@ def chat():
         return redirect("/signup")
 
     if request.method == "POST":
-        # Get the message and files from the request
-        files = request.files.getlist("files")
-        session_id = request.form.get("sessionId")
-
-        if files:
-            logger.info("Uploading files...")
-            # Prepare files for upload
-            files_to_upload = [
-                ("files", (file.filename, file.stream, file.content_type))
-                for file in files
-            ]
-            # Call the FastAPI file upload endpoint
-            try:
-                with api_request(
-                    "upload_files",
-                    id_token=id_token,
-                    files=files_to_upload,
-                    params={"session_id": session_id},
-                ) as r:
-                    r.raise_for_status()
-                    result = r.json()
-            except Exception:
-                logger.exception("Upload files failed.")
-                return jsonify({"error": "Failed to upload files"}), 400
-            logger.info("Files finished uploading. Result: %s", result)
-            return jsonify(result), 200
-        logger.warning("No files were provided.")
-        return jsonify({"error": "No files provided"}), 400
+        # Files are streamed on to the API as they arrive, see uploads.py
+        if request.content_length and request.content_length > uploads.MAX_BYTES:
+            return jsonify({"error": "Upload too large"}), 413
+        boundary = request.mimetype_params.get("boundary")
+        if request.mimetype != "multipart/form-data" or not boundary:
+            logger.warning("No files were provided.")
+            return jsonify({"error": "No files provided"}), 400
+
+        logger.info("Uploading files...")
+        send = partial(upload_file, id_token, request.args.get("sessionId"))
+        try:
+            fields, uploaded = uploads.relay_files(request.stream, boundary, send)
+        except RequestEntityTooLarge:
+            logger.warning("Upload exceeded %d bytes.", uploads.MAX_BYTES)
+            return jsonify({"error": "Upload too large"}), 413
+        except Exception:
+            logger.exception("Upload files failed.")
+            return jsonify({"error": "Failed to upload files"}), 400
+        if not uploaded:
+            logger.warning("No files were provided.")
+            return jsonify({"error": "No files provided"}), 400
+
+        results = []
+        session_id = request.args.get("sessionId") or fields.get("sessionId")
+        for filename, digest, result, error in uploaded:
+            if error is not None:
+                logger.error("Upload of %s failed: %s", filename, error)
+                results.append({"id": filename, "message": "Failure"})
+                continue
+            file_results = result.get("results", [])
+            if len(file_results) == 1 and file_results[0].get("message") == "Success":
+                uploads_cache.set(upload_key(user["firebase_uid"], session_id, digest), file_results[0])
+            results.extend(file_results)
+        logger.info("Files finished uploading. Results: %s", results)
+        if all(error is not None for *_, error in uploaded):
+            return jsonify({"error": "Failed to upload files", "results": results}), 400
+        return jsonify({"message": "Success", "results": results}), 200
     else:
         session_id = request.args.get("sessionId")
         message = request.args.get("message")
@@ -266,24 +453,69 @@ def chat():
             "user": user
         }
 
+        last_event_id = request.headers.get("Last-Event-ID")
+
         def generate():
+            metrics.ACTIVE_STREAMS.inc()
             try:
-                with api_request("chat_session_stream", id_token=id_token, data=request_data, stream=True) as r:
-                    r.raise_for_status()
-                    for line in r.iter_lines(decode_unicode=True):
-                        if line:
-                            yield f"data: {line}\n\n"
+                yield sse.RETRY
+                if last_event_id:
+                    logger.info("Resuming chat stream after event %s", last_event_id)
+                    stream, after = sse.streams.resume(last_event_id, session_id, user["firebase_uid"])
+                else:
+                    stream, after = open_chat_stream(request_data, id_token, user), 0
+                yield from stream.iter_events(after)
+            except LookupError:
+                logger.warning("Chat stream cannot be resumed after event %s", last_event_id)
+                yield sse.event(dumps({"type": "error"}).encode())
             except Exception:
                 logger.exception("Streaming error occurred.")
-                e_msg = dumps({"type": "error"})
-                yield f"data: {e_msg}\n\n"
+                yield sse.event(dumps({"type": "error"}).encode())
             finally:
-                done = dumps({"type": "done"})
-                yield f"data: {done}\n\n"
-                return
+                # On a client disconnect GeneratorExit propagates and nothing more is sent
+                metrics.ACTIVE_STREAMS.dec()
+            yield sse.event(dumps({"type": "done"}).encode())
 
         logger.info("Streaming chat response for request: %s", request_data)
-        return Response(generate(), mimetype="text/event-stream")
+        # Keeps the request's trace id for the upstream call and logs made while streaming
+        return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=sse.HEADERS)
+
+
+@app.route("/chat/upload_check", methods=["POST"])
+def upload_check():
+    """Return the earlier upload results of files, identified by SHA-256, that need no re-upload."""
+    if not session.get("id_token"):
+        return jsonify({"error": "Authentication required"}), 401
+    data = request.get_json(silent=True) or {}
+    session_id = data.get("sessionId")
+    if not session_id:
+        return jsonify({"error": "No session provided"}), 400
+    files = data.get("files", [])
+    if not isinstance(files, list) or not all(isinstance(file, dict) for file in files):
+        return jsonify({"error": "files must be a list of objects"}), 400
+    results = []
+    for file in files:
+        if not isinstance(file.get("sha256"), str):
+            continue
+        result = uploads_cache.get(upload_key(session.get("firebase_uid"), session_id, file.get("sha256")))
+        if result is not None:
+            results.append({**result, "id": file.get("name")})
+    logger.info("%d of %d files already uploaded", len(results), len(files))
+    return jsonify({"results": results}), 200
+
+
+@app.route("/chat/cancel", methods=["POST"])
+def cancel_chat():
+    """Stop generating the session's answer. The chat page sends this when it is left mid-stream."""
+    if not session.get("id_token"):
+        return jsonify({"error": "Authentication required"}), 401
+    data = request.get_json(silent=True) or request.form
+    session_id = data.get("sessionId")
+    if not session_id:
+        return jsonify({"error": "No session provided"}), 400
+    cancelled = sse.streams.cancel(session_id, session.get("firebase_uid"))
+    logger.info("Cancelled %d chat stream(s) for session %s", cancelled, session_id)
+    return jsonify({"cancelled": cancelled}), 200
 
 
 @app.route("/agent/<agent>/new_session", methods=["GET"])
@@ -297,6 +529,8 @@ def new_session(agent):
         with api_request("initialize_session", id_token=id_token, data={"bot_id": agent, "user": user}) as r:
             r.raise_for_status()
             return jsonify(r.json())
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("New session error occurred.")
         return jsonify({"error": "Failed to create session."}), 400
@@ -304,16 +538,16 @@ def new_session(agent):
 
 @app.route("/agent/<agent>/info", methods=["GET"])
 def agent_info(agent):
-    data = {"bot_id": agent}
     logger.info("Agent info endpoint called for ID %s", agent)
     id_token = session.get("id_token")
     if not id_token:
         return redirect("/signup")
 
+    user = {"firebase_uid": session.get("firebase_uid"), "email": session.get("email")}
     try:
-        with api_request("view_bot", id_token=id_token, params=data, method="POST") as r:
-            r.raise_for_status()
-            result = r.json()
+        result = fetch_bot(agent, id_token, user)
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Agent info endpoint fetch failed.")
         return jsonify({"error": "Failed to load agent."}), 400
@@ -324,35 +558,82 @@ def agent_info(agent):
     return jsonify(result)
 
 
+def session_summary(session_id, session_data):
+    return {
+        "id": session_id,
+        "title": session_data.get("title", "Untitled Chat"),
+        "lastModified": session_data.get("timestamp"),
+        "botId": session_data.get("bot_id"),
+    }
+
+
+def fetch_sessions_batch(session_ids, id_token, user):
+    """Look up sessions with one upstream call. Returns None if the API has no batch endpoint."""
+    global batch_sessions_unavailable_until
+    if time.monotonic() < batch_sessions_unavailable_until:
+        return None
+    data = {"session_ids": session_ids, "user": user}
+    with api_request(BATCH_SESSIONS_ENDPOINT, id_token=id_token, data=data) as r:
+        if r.status_code in (404, 405):
+            logger.info(
+                "Batch session lookup unavailable, fetching sessions one at a time for %ss.", BATCH_SESSIONS_RECHECK
+            )
+            batch_sessions_unavailable_until = time.monotonic() + BATCH_SESSIONS_RECHECK
+            return None
+        r.raise_for_status()
+        found = {s["session_id"]: s for s in r.json().get("sessions", [])}
+    return [
+        session_summary(session_id, found[session_id])
+        if session_id in found
+        else {"id": session_id, "error": "Session not found."}
+        for session_id in session_ids
+    ]
+
+
+def fetch_sessions_each(session_ids, id_token, user):
+    """Look up sessions with bounded concurrent fetch_session calls, keeping partial results."""
+    def fetch(session_id):
+        logger.info("Fetching session info for session ID %s", session_id)
+        with api_request("fetch_session", id_token=id_token, data={"session_id": session_id, "user": user}) as r:
+            r.raise_for_status()
+            return r.json()
+
+    results = fan_out(fetch, session_ids, SESSIONS_CONCURRENCY, SESSIONS_DEADLINE)
+    sessions = []
+    for session_id in dict.fromkeys(session_ids):
+        session_data, error = results[session_id]
+        if error:
+            logger.error("Failed to fetch session %s: %r", session_id, error)
+            message = "Timed out fetching session." if isinstance(error, TimeoutError) else "Failed to fetch session."
+            sessions.append({"id": session_id, "error": message})
+        else:
+            sessions.append(session_summary(session_id, session_data))
+    return sessions
+
+
 @app.route("/sessions", methods=["GET"])
 def get_sessions():
     # Get all sessions for this browser from localStorage on client side
-    # Then fetch session info from API for each session ID
+    # Then fetch session info from API for the session IDs
+    logger.info("Sessions endpoint called.")
+    id_token = session.get("id_token")
+    if not id_token:
+        return redirect("/signup")
+    user = {"firebase_uid": session.get("firebase_uid"), "email": session.get("email")}
+    session_ids = list(dict.fromkeys(request.args.getlist("ids[]")))
+    if not session_ids:
+        return jsonify([])
+    sessions = None
     try:
-        sessions = []
-        logger.info("Sessions endpoint called.")
-        id_token = session.get("id_token")
-        if not id_token:
-            return redirect("/signup")
-
-        for session_id in request.args.getlist("ids[]"):
-            logger.info("Fetching session info for session ID %s", session_id)
-            user = {"firebase_uid": session.get("firebase_uid"), "email": session.get("email")}
-            data = {"session_id": session_id, "user": user}
-            with api_request("fetch_session", id_token=id_token, data=data) as r:
-                r.raise_for_status()
-                session_data = r.json()
-                sessions.append({
-                    "id": session_id,
-                    "title": session_data.get("title", "Untitled Chat"),
-                    "lastModified": session_data.get("timestamp"),
-                    "botId": session_data.get("bot_id"),
-                })
-        logger.info("Sessions endpoint got responses: %s", sessions)
-        return jsonify(sessions)
+        sessions = fetch_sessions_batch(session_ids, id_token, user)
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
-        logger.exception("Sessions endpoint got an unexpected response.")
-        return jsonify({"error": "Failed to fetch sessions."}), 400
+        logger.exception("Batch session lookup failed, fetching sessions one at a time.")
+    if sessions is None:
+        sessions = fetch_sessions_each(session_ids, id_token, user)
+    logger.info("Sessions endpoint got responses: %s", sessions)
+    return jsonify(sessions)
 
 
 @app.route("/sessions-page", methods=["GET"])
@@ -370,11 +651,9 @@ def sessions_page():
     # Get all available bots for filtering options
     bots = {}
     try:
-        with api_request("view_bots", method="POST", data={"user": user}, id_token=id_token) as r:
-            if r.status_code == 200:
-                response_data = r.json()
-                if response_data.get("message") == "Success" and "data" in response_data:
-                    bots = response_data["data"]
+        bots = fetch_user_bots(id_token, user)
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Failed to fetch bots for sessions page.")
 
@@ -387,12 +666,21 @@ def sessions_page():
                 if response_data.get("message") == "Success" and "sessions" in response_data:
                     sessions = response_data["sessions"]
                     logger.info(f"Fetched {len(sessions)} sessions for user")
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Failed to fetch sessions for user")
 
     return render_template("sessions.html", user=user, bots=bots, sessions=sessions)
 
 
+def fetch_session_history(session_id, id_token, user):
+    data = {"session_id": session_id, "user": user}
+    with api_request("fetch_session_formatted_history", id_token=id_token, data=data) as r:
+        r.raise_for_status()
+        return r.json()
+
+
 @app.route("/get_session_messages/<session_id>", methods=["GET"])
 def get_session_messages(session_id):
     logger.info("Session messages endpoint called for session ID %s", session_id)
@@ -402,34 +690,58 @@ def get_session_messages(session_id):
 
     try:
         user = {"firebase_uid": session.get("firebase_uid"), "email": session.get("email")}
-        data = {"session_id": session_id, "user": user}
-        with api_request("fetch_session_formatted_history", id_token=id_token, data=data) as r:
-            r.raise_for_status()
-            session_data = r.json()
-            logger.debug("Session messages endpoint got response: %s", session_data)
-            return jsonify(session_data)
+        session_data = fetch_session_history(session_id, id_token, user)
+        logger.debug("Session messages endpoint got response: %s", session_data)
+        return jsonify(session_data)
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Session messages endpoint got an unexpected response.")
         return jsonify({"error": "Failed to fetch messages."}), 400
 
 
+HEALTH_TIMEOUT = float(os.environ.get("OPB_HEALTH_TIMEOUT", 5))
+
+
+def probe_upstream():
+    """Health check: the API root answers, and not with a gateway error."""
+    with get_client().get(f"{api_url}/", timeout=HEALTH_TIMEOUT) as r:
+        return r.status_code not in health.UNAVAILABLE_STATUSES
+
+
+prober = health.HealthProber(probe_upstream, health.breaker)
+
+
+# Routes re-raise UpstreamUnavailable past their own error handling, so every
+# call refused by the circuit breaker gets this answer.
+@app.errorhandler(health.UpstreamUnavailable)
+def upstream_unavailable(e):
+    logger.warning("Failing fast: %s", e)
+    return jsonify({"status": "degraded", "error": "The OPB API is unavailable, try again shortly."}), 503
+
+
 @app.route("/status", methods=["GET"])
 def get_status():
-    logger.info("Status endpoint called.")
+    """The OPB API's health from the shared background probe, without calling upstream."""
     id_token = session.get("id_token")
     if not id_token:
         return redirect("/signup")
-    try:
-        with api_request("", method="GET", id_token=id_token, timeout=5) as r:
-            r.raise_for_status()
-    except requests.exceptions.Timeout:
-        logger.exception("Status endpoint timed out.")
-        return {"status": "timeout"}
-    except Exception:
-        logger.exception("Status endpoint got an unexpected response")
-        return jsonify({"status": "not ok"}), 400
-    logger.info("Status endpoint got OK response.")
-    return jsonify({"status": "ok"})
+    upstream = prober.status()
+    degraded = upstream["status"] == "down" or health.breaker.state == health.breaker.OPEN
+    if degraded:
+        logger.warning("Status is degraded: %s, circuit breaker %s.", upstream, health.breaker.state)
+    return jsonify({
+        "status": "degraded" if degraded else "ok",
+        "upstream": upstream,
+        "breaker": health.breaker.state,
+    })
+
+
+@app.route("/cache_stats", methods=["GET"])
+def get_cache_stats():
+    if not session.get("id_token"):
+        return jsonify({"error": "Authentication required"}), 401
+    return jsonify(cache_stats())
 
 
 @app.route("/feedback", methods=["POST"])
@@ -455,6 +767,8 @@ def feedback():
         with api_request("session_feedback", id_token=id_token, data=data) as r:
             r.raise_for_status()
             result = r.json()
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Feedback failed.")
         return jsonify({"status": "not ok"}), 400
@@ -499,31 +813,47 @@ def search(collection):
         data["after_date"] = after_date
     if before_date:
         data["before_date"] = before_date
-    try:
-        with api_request("search_collection", id_token=id_token, data=data) as r:
-            r.raise_for_status()
-            result = r.json()
-    except Exception:
-        logger.exception("Search endpoint fetch failed.")
-        return jsonify({"error": "Failed to search collection."}), 400
-    if result["results"] is None:
-        logger.error("Search endpoint got an unexpected response.")
-        return jsonify({"error": "Failed to search collection."}), 400
-    results = result["results"]
-    organized = organize_sources(results)
-    sources = [
-        generate_source_context(s["source"], i, s["entities"], keyword=keyword)
-        for i, s in enumerate(organized)
-    ]
+    cache_key = search_cache_key(data)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        sources, results_count = cached
+    else:
+        try:
+            with api_request("search_collection", id_token=id_token, data=data) as r:
+                r.raise_for_status()
+                result = r.json()
+        except health.UpstreamUnavailable:
+            raise
+        except Exception:
+            logger.exception("Search endpoint fetch failed.")
+            return jsonify({"error": "Failed to search collection."}), 400
+        if result["results"] is None:
+            logger.error("Search endpoint got an unexpected response.")
+            return jsonify({"error": "Failed to search collection."}), 400
+        results = result["results"]
+        results_count = len(results)
+        with metrics.timed("organize"):
+            organized = organize_sources(results)
+        with metrics.timed("context"):
+            sources = [
+                generate_source_context(s["source"], i, s["entities"], keyword=keyword)
+                for i, s in enumerate(organized)
+            ]
+        search_cache.set(cache_key, (sources, results_count))
+    if SUMMARY_PREFETCH_N > 0:
+        # Only opinions have summaries to fetch, and those with an AI summary already show it
+        opinion_ids = [source["opinion_id"] for source in sources if source.get("opinion_id") and not source.get("ai_summary")]
+        prefetch_summaries(opinion_ids[:SUMMARY_PREFETCH_N], id_token, uid)
     end = time.time()
     elapsed = str(round(end - start, 5))
     return render_template(
         "search.html",
         collection=collection,
         results=sources,
-        results_count=len(results),
+        results_count=results_count,
         form_data=data,
         elapsed=elapsed,
+        cached=cached is not None,
         jurisdictions=JURISDICTIONS,
         user=user,
     )
@@ -563,6 +893,8 @@ def manage(collection):
         with api_request("browse_collection", id_token=id_token, data=data, params=params) as r:
             r.raise_for_status()
             result = r.json()
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Manage endpoint fetch failed.")
         return jsonify({"error": "Failed to manage collection."}), 400
@@ -570,11 +902,13 @@ def manage(collection):
         logger.error("Manage endpoint got an unexpected response.")
         return jsonify({"error": "Failed to manage collection."}), 400
     results = result["results"]
-    organized = organize_sources(results)
-    sources = [
-        generate_source_context(s["source"], i, s["entities"], keyword=keyword)
-        for i, s in enumerate(organized)
-    ]
+    with metrics.timed("organize"):
+        organized = organize_sources(results)
+    with metrics.timed("context"):
+        sources = [
+            generate_source_context(s["source"], i, s["entities"], keyword=keyword)
+            for i, s in enumerate(organized)
+        ]
     end = time.time()
     elapsed = str(round(end - start, 5))
 
@@ -592,6 +926,42 @@ def manage(collection):
         user=user,
     )
 
+# Resource counts by (user, collection), since the API checks each user's
+# access to the collection. Counting a large collection is slow, so an
+# expired count is still served while a background call refreshes it, and
+# concurrent misses share one upstream call.
+resource_counts = new_cache(
+    "resource_counts",
+    ttl=float(os.environ.get("OPB_RESOURCE_COUNT_TTL", 600)),
+    max_entries=int(os.environ.get("OPB_RESOURCE_COUNT_MAX_ENTRIES", 1000)),
+    keep_stale=True,
+)
+resource_count_calls = SingleFlight()
+
+
+def load_resource_count(collection_name, id_token, uid):
+    with api_request(f"resource_count/{collection_name}", method="GET", id_token=id_token, timeout=45) as r:
+        r.raise_for_status()
+        count = r.json().get("resource_count")
+    if count is not None:
+        resource_counts.set((uid, collection_name), count)
+    return count
+
+
+def fetch_resource_count(collection_name, id_token, uid):
+    """Return the collection's resource count for the user, or None if the API has none."""
+    key = (uid, collection_name)
+    count = resource_counts.get(key)
+    if count is not None:
+        return count
+    load = partial(load_resource_count, collection_name, id_token, uid)
+    count = resource_counts.get_stale(key)
+    if count is not None:
+        resource_count_calls.start(key, load)
+        return count
+    return resource_count_calls.do(key, load)
+
+
 @app.route("/resource_count/<collection_name>")
 def get_resource_count(collection_name) -> int:
     logger.info("Getting resource count for collection %s.", collection_name)
@@ -599,35 +969,150 @@ def get_resource_count(collection_name) -> int:
     if not id_token:
         return redirect("/signup")
     try:
-        with api_request(f"resource_count/{collection_name}", method="GET", id_token=id_token, timeout=45) as r:
-            r.raise_for_status()
-            result = r.json()
+        count = fetch_resource_count(collection_name, id_token, session.get("firebase_uid"))
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Resource count endpoint got an unexpected response.")
         return {"message": "Failure: exception in request or bad response code"}
-    if "resource_count" in result:
-        return {"message": "Success", "resource_count": result["resource_count"]}
+    if count is not None:
+        return {"message": "Success", "resource_count": count}
     return {"message": "Failure: no resource count found"}
 
 
+# Formatted summaries by (user, resource ID), on disk so every worker shares
+# them and they survive restarts. A summary doesn't change once generated. The
+# user is part of the key because the API checks each user's access.
+summary_cache = new_cache(
+    "summaries",
+    ttl=float(os.environ.get("OPB_SUMMARY_CACHE_TTL", 30 * 24 * 3600)),
+    backend="sqlite",
+    persist=True,
+)
+summary_calls = SingleFlight()
+SUMMARY_CONCURRENCY = int(os.environ.get("OPB_SUMMARY_CONCURRENCY", 4))
+SUMMARY_DEADLINE = float(os.environ.get("OPB_SUMMARY_DEADLINE", 60))
+SUMMARY_BATCH_MAX = int(os.environ.get("OPB_SUMMARY_BATCH_MAX", 50))
+# Summaries of this many top opinion results are fetched in the background
+SUMMARY_PREFETCH_N = int(os.environ.get("OPB_SUMMARY_PREFETCH_N", 0))
+SUMMARY_PREFETCH_QUEUE = int(os.environ.get("OPB_SUMMARY_PREFETCH_QUEUE", 100))
+summary_prefetcher = ThreadPoolExecutor(max_workers=SUMMARY_CONCURRENCY, thread_name_prefix="summary-prefetch")
+summary_prefetch_lock = threading.Lock()
+summary_prefetches = 0
+
+
+def load_summary(resource_id, id_token, uid):
+    """Fetch and format a summary from the API and cache it. Returns None if there is none."""
+    params = {"resource_id": resource_id}
+    with api_request("summary", method="GET", id_token=id_token, params=params, timeout=30) as r:
+        r.raise_for_status()
+        result = r.json()
+    if "result" not in result:
+        return None
+    summary = format_summary(result["result"])
+    summary_cache.set((uid, resource_id), summary)
+    return summary
+
+
+def fetch_summary_cached(resource_id, id_token, uid):
+    key = (uid, resource_id)
+    summary = summary_cache.get(key)
+    if summary is not None:
+        return summary
+    return summary_calls.do(key, partial(load_summary, resource_id, id_token, uid))
+
+
+def cached_summaries(resource_ids, uid):
+    """The user's cached summaries among ``resource_ids``, by resource ID."""
+    found = summary_cache.get_many([(uid, resource_id) for resource_id in resource_ids])
+    return {resource_id: summary for (_, resource_id), summary in found.items()}
+
+
+def fetch_summaries(resource_ids, id_token, uid):
+    """Return ``{resource_id: (summary, error)}``, fetching the uncached ones concurrently."""
+    found = cached_summaries(resource_ids, uid)
+    missing = [resource_id for resource_id in resource_ids if resource_id not in found]
+    fetched = fan_out(
+        lambda resource_id: summary_calls.do((uid, resource_id), partial(load_summary, resource_id, id_token, uid)),
+        missing,
+        SUMMARY_CONCURRENCY,
+        SUMMARY_DEADLINE,
+    )
+    return {**{resource_id: (summary, None) for resource_id, summary in found.items()}, **fetched}
+
+
+def prefetch_summaries(resource_ids, id_token, uid):
+    """Warm the summary cache in the background so "Get Summary" answers at once.
+
+    Fetches run on a pool of SUMMARY_CONCURRENCY threads shared by all
+    requests. While SUMMARY_PREFETCH_QUEUE fetches are waiting, new ones are
+    dropped.
+    """
+    global summary_prefetches
+    found = cached_summaries(resource_ids, uid)
+    for resource_id in resource_ids:
+        if resource_id in found:
+            continue
+        with summary_prefetch_lock:
+            if summary_prefetches >= SUMMARY_PREFETCH_QUEUE:
+                logger.info("Summary prefetch queue is full, skipping the rest.")
+                return
+            summary_prefetches += 1
+        summary_prefetcher.submit(copy_context().run, prefetch_summary, resource_id, id_token, uid)
+
+
+def prefetch_summary(resource_id, id_token, uid):
+    global summary_prefetches
+    try:
+        fetch_summary_cached(resource_id, id_token, uid)
+    except Exception as e:
+        logger.warning("Prefetching summary for %s failed: %s", resource_id, e)
+    finally:
+        with summary_prefetch_lock:
+            summary_prefetches -= 1
+
+
 @app.route("/summary/<resource_id>")
 def fetch_summary(resource_id):
     logger.info("Fetching summary for %s.", resource_id)
     id_token = session.get("id_token")
     if not id_token:
         return redirect("/signup")
-    params = {"resource_id": resource_id}
     try:
-        with api_request("summary", method="GET", id_token=id_token, params=params, timeout=30) as r:
-            r.raise_for_status()
-            result = r.json()
+        summary = fetch_summary_cached(resource_id, id_token, session.get("firebase_uid"))
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Summary endpoint got an unexpected response.")
         return {"message": "Failure: exception in request or bad response code"}
-    if "result" not in result:
+    if summary is None:
         return {"message": "Failure: no summary found"}
-    summary = result["result"]
-    return {"message": "Success", "summary": format_summary(summary)}
+    return {"message": "Success", "summary": summary}
+
+
+@app.route("/summaries", methods=["POST"])
+def fetch_summary_batch():
+    """Summaries for several resources at once, as ``{"summaries": {id: summary}, "failed": [id]}``."""
+    id_token = session.get("id_token")
+    if not id_token:
+        return jsonify({"error": "Authentication required"}), 401
+    resource_ids = (request.get_json(silent=True) or {}).get("resource_ids", [])
+    if not isinstance(resource_ids, list) or not resource_ids:
+        return jsonify({"error": "No resource IDs provided"}), 400
+    if not all(isinstance(resource_id, str) and resource_id for resource_id in resource_ids):
+        return jsonify({"error": "Resource IDs must be non-empty strings"}), 400
+    if len(resource_ids) > SUMMARY_BATCH_MAX:
+        return jsonify({"error": f"At most {SUMMARY_BATCH_MAX} resource IDs per request"}), 400
+    logger.info("Fetching summaries for %d resources.", len(resource_ids))
+    summaries, failed = {}, []
+    for resource_id, (summary, error) in fetch_summaries(resource_ids, id_token, session.get("firebase_uid")).items():
+        if error is not None:
+            logger.error("Summary for %s failed: %s", resource_id, error)
+        if summary is None:
+            failed.append(resource_id)
+        else:
+            summaries[resource_id] = summary
+    return {"message": "Success", "summaries": summaries, "failed": failed}
 
 
 @app.route("/create-agent", methods=["GET", "POST"])
@@ -699,9 +1184,13 @@ def create_agent():
         with api_request("create_bot", id_token=id_token, data=bot_data) as r:
             r.raise_for_status()
             result = r.json()
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Create agent failed.")
         return jsonify({"error": "Failed to create agent."}), 400
+    finally:
+        bots_cache.invalidate(user["firebase_uid"])
     logger.debug("Created agent: %s", result)
     if result["message"] != "Success":
         logger.error("Create agent received an unexpected response.")
@@ -718,16 +1207,20 @@ def create_agent():
 @app.route("/clone/<agent>", methods=["GET"])
 def clone_agent(agent):
     logger.info("Cloning agent: %s", agent)
-    data = {"bot_id": agent}
     id_token = session.get("id_token")
     if not id_token:
         return redirect("/signup")
 
+    email = session.get("email")
+    user = {
+        "email": email,
+        "firebase_uid": session.get("firebase_uid")
+    }
     logger.info("Fetching agent info for ID %s", agent)
     try:
-        with api_request("view_bot", method="POST", id_token=id_token, params=data) as r:
-            r.raise_for_status()
-            result = r.json()
+        result = fetch_bot(agent, id_token, user)
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Fetch agent info failed.")
         return jsonify({"error": "Failed to load agent."}), 400
@@ -766,11 +1259,6 @@ def clone_agent(agent):
         "temperature": temperature,
         "seed": seed,
     }
-    email = session.get("email")
-    user = {
-        "email": email,
-        "firebase_uid": session.get("firebase_uid")
-    }
     return render_template("create_agent.html", clone=True, agent=agent, user=user)
 
 
@@ -784,6 +1272,7 @@ def delete_agent(agent_id):
         logger.warning("User not authenticated, redirecting to signup")
         return redirect("/signup")
 
+    user = {"firebase_uid": session.get("firebase_uid"), "email": session.get("email")}
     try:
         # Call the delete_bot/{bot_id} endpoint
         endpoint = f"delete_bot/{agent_id}"
@@ -809,17 +1298,110 @@ def delete_agent(agent_id):
                     logger.exception("Failed to delete agent.")
                 logger.error("Failed to delete agent: %s - %s", r.status_code, r.text)
                 flash(error_msg, "error")
+    except health.UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.exception("Exception while deleting agent.")
         flash(f"Error deleting agent: {e!s}", "error")
+    finally:
+        bots_cache.invalidate(user["firebase_uid"])
+        bot_cache.invalidate_where(lambda key: key[0] == agent_id)
 
     # Redirect back to the agents page
     return redirect("/agents")
 
 
+def export_session(session_id, id_token, user, bots):
+    """Fetch one session's metadata and messages for export.
+
+    Returns the exported session, an error message if only the messages
+    couldn't be fetched, and the elapsed time.
+    """
+    start = time.monotonic()
+    with api_request("fetch_session", id_token=id_token, data={"session_id": session_id, "user": user}) as r:
+        r.raise_for_status()
+        session_metadata = r.json()
+
+    messages_error = None
+    try:
+        session_metadata["messages"] = fetch_session_history(session_id, id_token, user).get("history", [])
+    except Exception:
+        logger.exception("Error fetching messages for session %s.", session_id)
+        messages_error = "Failed to fetch messages."
+        session_metadata["messages"] = []
+
+    # Get bot name if available
+    bot_id = session_metadata.get("bot_id", "")
+    bot_name = "Unknown Agent"
+    if bot_id and bot_id in bots:
+        bot_name = bots[bot_id].get("name", "Unknown Agent")
+
+    exported = {
+        "session_id": session_id,
+        "bot_id": bot_id,
+        "bot_name": bot_name,
+        "title": session_metadata.get("title", "Untitled Chat"),
+        "timestamp": session_metadata.get("timestamp", ""),
+        "messages": session_metadata.get("messages", [])
+    }
+    return exported, messages_error, time.monotonic() - start
+
+
+def iter_exported_sessions(session_ids, id_token, user, bots, deadline=None, timeout=None):
+    """Yield ``(exported session or None, report entry)`` as each session is fetched.
+
+    ``deadline`` bounds the whole export and ``timeout`` each session, as for ``iter_fan_out``.
+    """
+    def fetch(session_id):
+        return export_session(session_id, id_token, user, bots)
+
+    sessions = iter_fan_out(fetch, session_ids, EXPORT_CONCURRENCY, deadline=deadline, timeout=timeout)
+    for session_id, result, error in sessions:
+        if error:
+            # Continue with other sessions even if one fails
+            logger.error("Error exporting session %s: %r", session_id, error)
+            message = "Timed out." if isinstance(error, TimeoutError) else "Failed to fetch session."
+            yield None, {"session_id": session_id, "error": message}
+            continue
+        exported, messages_error, elapsed = result
+        entry = {"session_id": session_id, "elapsed": round(elapsed, 5)}
+        if messages_error:
+            entry["error"] = messages_error
+        yield exported, entry
+
+
+def stream_export_ndjson(session_ids, id_token, user, bots):
+    """One JSON object per line: each exported session, or an error record for a failed one."""
+    for exported, entry in iter_exported_sessions(session_ids, id_token, user, bots, timeout=EXPORT_SESSION_TIMEOUT):
+        yield dumps(exported if exported else entry) + "\n"
+
+
+def stream_export_zip(session_ids, id_token, user, bots):
+    """A zip archive with one JSON file per session and a report.json at the end."""
+    def files():
+        report = []
+        for exported, entry in iter_exported_sessions(session_ids, id_token, user, bots, timeout=EXPORT_SESSION_TIMEOUT):
+            report.append(entry)
+            if exported:
+                yield f"session_{exported['session_id']}.json", dumps(exported, indent=2)
+        yield "report.json", dumps(report, indent=2)
+
+    return iter_zip(files())
+
+
+EXPORT_STREAMS = {
+    "ndjson": (stream_export_ndjson, "application/x-ndjson", "ndjson"),
+    "zip": (stream_export_zip, "application/zip", "zip"),
+}
+
+
 @app.route("/export_sessions", methods=["POST"])
 def export_sessions():
-    """Export multiple sessions with their full data including messages."""
+    """Export multiple sessions with their full data including messages.
+
+    ``format`` is ``json`` (default), or ``ndjson``/``zip`` to stream the
+    sessions as they are fetched. Accepts a JSON body or a form post.
+    """
     logger.info("Export sessions endpoint called.")
 
     # Get the user's ID token from the session
@@ -832,86 +1414,70 @@ def export_sessions():
 
     # Get session IDs from request
     try:
-        request_data = request.get_json()
+        request_data = request.get_json(silent=True)
+        if request_data is None and request.form:
+            request_data = {
+                "session_ids": request.form.getlist("session_ids"),
+                "format": request.form.get("format", "json"),
+            }
         if not request_data or not isinstance(request_data, dict) or "session_ids" not in request_data:
             return jsonify({"error": "Missing session_ids parameter"}), 400
 
         session_ids = request_data["session_ids"]
         if not isinstance(session_ids, list) or not session_ids:
             return jsonify({"error": "session_ids must be a non-empty list"}), 400
+        if not all(isinstance(session_id, str) and session_id for session_id in session_ids):
+            return jsonify({"error": "session_ids must be non-empty strings"}), 400
+
+        export_format = request_data.get("format", "json")
+        if not isinstance(export_format, str) or (export_format != "json" and export_format not in EXPORT_STREAMS):
+            return jsonify({"error": "format must be one of json, ndjson, zip"}), 400
 
         logger.info(f"Exporting {len(session_ids)} sessions")
 
         # Get all available bots to retrieve bot names
         bots = {}
         try:
-            with api_request("view_bots", method="POST", data={"user": user}, id_token=id_token) as r:
-                if r.status_code == 200:
-                    response_data = r.json()
-                    if response_data.get("message") == "Success" and "data" in response_data:
-                        bots = response_data["data"]
+            bots = fetch_user_bots(id_token, user)
+        except health.UpstreamUnavailable:
+            raise
         except Exception:
             logger.exception("Failed to fetch bots for export sessions.")
 
-        # Fetch data for each session
-        exported_sessions = []
-        for session_id in session_ids:
-            try:
-                # Get session metadata
-                session_metadata = {}
-                with api_request("fetch_session", id_token=id_token, data={"session_id": session_id, "user": user}) as r:
-                    if r.status_code == 200:
-                        session_metadata = r.json()
-                    else:
-                        logger.warning(f"Failed to fetch session {session_id}: {r.status_code}")
-                        continue
-
-                # Get session messages using internal request to our own endpoint
-                messages_url = f"{request.host_url.rstrip('/')}/get_session_messages/{session_id}"
-                headers = {"Cookie": f"session={request.cookies.get('session', '')}"}
+        if export_format in EXPORT_STREAMS:
+            stream, mimetype, extension = EXPORT_STREAMS[export_format]
+            filename = f"exported_sessions_{datetime.date.today().isoformat()}.{extension}"
+            return Response(
+                stream_with_context(stream(session_ids, id_token, user, bots)),
+                mimetype=mimetype,
+                headers={"Content-Disposition": f"attachment; filename={filename}"},
+            )
 
-                try:
-                    messages_response = requests.get(messages_url, headers=headers, timeout=10)
-                    if messages_response.status_code == 200:
-                        messages_data = messages_response.json()
-                        # Add messages to session data
-                        session_metadata["messages"] = messages_data.get("history", [])
-                    else:
-                        logger.warning(f"Failed to fetch messages for session {session_id}: {messages_response.status_code}")
-                        session_metadata["messages"] = []
-                except Exception:
-                    logger.exception("Error fetching messages for session %s.", session_id)
-                    session_metadata["messages"] = []
-
-                # Get bot name if available
-                bot_id = session_metadata.get("bot_id", "")
-                bot_name = "Unknown Agent"
-                if bot_id and bot_id in bots:
-                    bot_name = bots[bot_id].get("name", "Unknown Agent")
-
-                # Add to exported sessions
-                exported_sessions.append({
-                    "session_id": session_id,
-                    "bot_id": bot_id,
-                    "bot_name": bot_name,
-                    "title": session_metadata.get("title", "Untitled Chat"),
-                    "timestamp": session_metadata.get("timestamp", ""),
-                    "messages": session_metadata.get("messages", [])
-                })
-
-            except Exception:
-                logger.exception("Error exporting session %s", session_id)
-                # Continue with other sessions even if one fails
+        # Fetch metadata and messages for the sessions concurrently
+        exported_sessions = []
+        report = []
+        for exported, entry in iter_exported_sessions(session_ids, id_token, user, bots, deadline=EXPORT_DEADLINE):
+            if exported:
+                exported_sessions.append(exported)
+            report.append(entry)
+        # Keep the order the sessions were requested in
+        order = {session_id: i for i, session_id in enumerate(session_ids)}
+        exported_sessions.sort(key=lambda s: order[s["session_id"]])
+        report.sort(key=lambda e: order[e["session_id"]])
 
         if not exported_sessions:
-            return jsonify({"error": "Failed to export any sessions"}), 500
+            return jsonify({"error": "Failed to export any sessions", "report": report}), 500
 
         return jsonify({
             "message": "Success",
             "count": len(exported_sessions),
+            "failed": sum(1 for entry in report if "error" in entry),
+            "report": report,
             "sessions": exported_sessions
         })
 
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Export sessions endpoint error.")
         return jsonify({"error": "Failed to export sessions"}), 500
@@ -937,6 +1503,8 @@ def eval_datasets():
                 if response_data.get("message") == "Success" and "datasets" in response_data:
                     datasets = response_data["datasets"]
                     logger.info(f"Fetched {len(datasets)} evaluation datasets for user")
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Failed to fetch evaluation datasets for user.")
 
@@ -959,12 +1527,10 @@ def create_eval_dataset():
         # Get all available bots for selection
         bots = {}
         try:
-            with api_request("view_bots", method="POST", data={"user": user}, id_token=id_token) as r:
-                if r.status_code == 200:
-                    response_data = r.json()
-                    if response_data.get("message") == "Success" and "data" in response_data:
-                        bots = response_data["data"]
-                        logger.info("Fetched %s bots for eval dataset creation", len(bots))
+            bots = fetch_user_bots(id_token, user)
+            logger.info("Fetched %s bots for eval dataset creation", len(bots))
+        except health.UpstreamUnavailable:
+            raise
         except Exception:
             logger.exception("Failed to fetch bots for eval dataset creation.")
 
@@ -1007,6 +1573,8 @@ def create_eval_dataset():
                 flash(f"Failed to create evaluation dataset: {result.get('message', 'Unknown error')}", "error")
                 return redirect("/create-eval-dataset")
 
+    except health.UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.exception("Error creating evaluation dataset.")
         flash(f"Error creating evaluation dataset: {e!s}", "error")
@@ -1034,11 +1602,9 @@ def view_eval_dataset(dataset_id):
                     # Get all available bots to retrieve bot names
                     bots = {}
                     try:
-                        with api_request("view_bots", method="POST", data={"user": user}, id_token=id_token) as r:
-                            if r.status_code == 200:
-                                response_data = r.json()
-                                if response_data.get("message") == "Success" and "data" in response_data:
-                                    bots = response_data["data"]
+                        bots = fetch_user_bots(id_token, user)
+                    except health.UpstreamUnavailable:
+                        raise
                     except Exception:
                         logger.exception("Failed to fetch bots for eval dataset view")
 
@@ -1057,6 +1623,8 @@ def view_eval_dataset(dataset_id):
                     flash(f"Failed to fetch evaluation dataset: {dataset.get('message', 'Unknown error')}", "error")
             else:
                 flash(f"Failed to fetch evaluation dataset: {r.status_code}", "error")
+    except health.UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.exception("Error fetching evaluation dataset.")
         flash(f"Error fetching evaluation dataset: {e!s}", "error")
@@ -1080,6 +1648,8 @@ def clone_eval_dataset(dataset_id):
         with api_request(f"get_dataset_sessions/{dataset_id}", method="GET", id_token=id_token) as r:
             r.raise_for_status()
             result = r.json()
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Fetch dataset info failed.")
         return jsonify({"error": "Failed to load dataset."}), 400
@@ -1102,13 +1672,15 @@ def clone_eval_dataset(dataset_id):
     # Get all available bots for selection
     bots = {}
     try:
-        with api_request("view_bots", method="POST", data={"user": user}, id_token=id_token) as r:
-            if r.status_code == 200:
-                response_data = r.json()
-                if response_data.get("message") == "Success" and "data" in response_data:
-                    bots = response_data["data"]
-                    logger.info(f"Fetched {len(bots)} bots for eval dataset creation")
+        bots = fetch_user_bots(id_token, user)
+        logger.info(f"Fetched {len(bots)} bots for eval dataset creation")
+    except health.UpstreamUnavailable:
+        raise
     except Exception:
         logger.exception("Failed to fetch bots for eval dataset creation")
 
     return render_template("create_eval_dataset.html", user=user, bots=bots, dataset=dataset)
+
+
+if PRECOMPILE_TEMPLATES:
+    precompile_templates()
@@ -1,11 +1,28 @@
+import base64
 import datetime
+import io
 import logging
 import os
 import re
+import socket
+import threading
+import time
+import zipfile
+from contextvars import copy_context
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
 from html import escape
+from itertools import islice
+from json import dumps
 
 import requests
-from markdown import markdown
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util import Retry
+
+from cache import FileSingleFlight, SingleFlight
+from health import UNAVAILABLE_STATUSES, UpstreamUnavailable, breaker
+from metrics import TRACE_HEADER, current_trace_id, observe_circuit_open, observe_coalesced, observe_upstream
 
 JURISDICTIONS = [
     {"display": "Federal Appellate", "value": "us-app"},
@@ -66,15 +83,154 @@ JURISDICTIONS = [
 ]
 
 
-formatter = logging.Formatter("%(asctime)s %(levelname)s %(funcName)s %(message)s")
+class TraceIdFilter(logging.Filter):
+    """Adds the current request's trace id to log records, or "-" outside a request."""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+
+formatter = logging.Formatter("%(asctime)s %(levelname)s [%(trace_id)s] %(funcName)s %(message)s")
 handler = logging.StreamHandler()
 handler.setFormatter(formatter)
+handler.addFilter(TraceIdFilter())
 logger = logging.getLogger("logger")
 logger.setLevel(logging.INFO)
 logger.addHandler(handler)
 
 api_url = os.environ["OPB_API_URL"]
 
+# Upstream connection pool: number of hosts kept and connections kept per host.
+POOL_CONNECTIONS = int(os.environ.get("OPB_POOL_CONNECTIONS", 4))
+POOL_MAXSIZE = int(os.environ.get("OPB_POOL_MAXSIZE", 32))
+RETRY_TOTAL = int(os.environ.get("OPB_RETRY_TOTAL", 2))
+RETRY_BACKOFF = float(os.environ.get("OPB_RETRY_BACKOFF", 0.3))
+DEFAULT_TIMEOUT = float(os.environ.get("OPB_DEFAULT_TIMEOUT", 30))
+
+# Read-only endpoints that are safe to send again after a connection error or a 502/503/504.
+IDEMPOTENT_ENDPOINTS = {
+    "",
+    "view_bots",
+    "view_bot",
+    "fetch_session",
+    "fetch_sessions",
+    "fetch_session_formatted_history",
+    "resource_count",
+    "summary",
+    "get_user_datasets",
+    "get_dataset_sessions",
+}
+
+# Concurrent identical calls to the read-only endpoints above share one upstream
+# request: "worker" within a worker, "shared" across workers too, or "off".
+# Calls from different users are kept apart, except for these endpoints whose
+# answers are the same for everyone. The API checks each user's access to
+# collections and resources, so resource_count and summary are not among them.
+SINGLE_FLIGHT = os.environ.get("OPB_SINGLE_FLIGHT", "worker")
+SHARED_ANSWER_ENDPOINTS = {""}
+_calls = SingleFlight()
+_shared_calls = FileSingleFlight() if SINGLE_FLIGHT == "shared" else None
+
+# Default (connect, read) timeouts, used when the caller doesn't pass one.
+ENDPOINT_TIMEOUTS = {
+    "": 5,
+    "view_bots": 10,
+    "view_bot": 10,
+    "fetch_session": 10,
+    "fetch_sessions": 15,
+    "fetch_session_formatted_history": 15,
+    "initialize_session": 10,
+    "session_feedback": 10,
+    "search_collection": 60,
+    "browse_collection": 60,
+    "resource_count": 45,
+    "summary": 30,
+    "chat_session_stream": (5, 120),
+    "upload_files": (5, 300),
+}
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def _new_client(retry):
+    max_retries = 0
+    if retry:
+        max_retries = Retry(
+            total=RETRY_TOTAL,
+            # A read timeout is not retried: it would multiply the wait and the load on a slow API
+            read=False,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=max_retries)
+    client = requests.Session()
+    client.mount("http://", adapter)
+    client.mount("https://", adapter)
+    return client
+
+
+def get_client(retry=False) -> requests.Session:
+    """Return this worker's pooled keep-alive session, creating it after a fork."""
+    global _clients, _clients_pid
+    pid = os.getpid()
+    with _clients_lock:
+        if _clients_pid != pid:
+            # Sockets must not be shared with the parent process
+            _clients = {}
+            _clients_pid = pid
+        if retry not in _clients:
+            _clients[retry] = _new_client(retry)
+        return _clients[retry]
+
+
+def endpoint_name(endpoint):
+    return endpoint.split("/", 1)[0]
+
+
+def single_flight_key(name, endpoint, method, id_token, data, params, headers):
+    """Key identifying an upstream call that may share a request in flight, or None."""
+    if SINGLE_FLIGHT == "off" or name not in IDEMPOTENT_ENDPOINTS:
+        return None
+    return (
+        method,
+        endpoint,
+        dumps(data, sort_keys=True, default=str),
+        dumps(params, sort_keys=True, default=str),
+        tuple(sorted(headers.items())),
+        None if name in SHARED_ANSWER_ENDPOINTS else id_token,
+    )
+
+
+def dump_response(r):
+    """A read response as JSON-serializable data, without its request (and token), for other workers."""
+    return {
+        "status": r.status_code,
+        "reason": r.reason,
+        "headers": dict(r.headers),
+        "url": r.url,
+        "encoding": r.encoding,
+        "body": base64.b64encode(r.content).decode(),
+    }
+
+
+def load_response(data):
+    """Rebuild a response from ``dump_response``'s data."""
+    r = requests.Response()
+    r._content = base64.b64decode(data["body"])
+    r._content_consumed = True
+    r.status_code = data["status"]
+    r.reason = data["reason"]
+    r.headers = CaseInsensitiveDict(data["headers"])
+    r.url = data["url"]
+    r.encoding = data["encoding"]
+    return r
+
+
 def api_request(
     endpoint,
     method="POST",
@@ -84,43 +240,219 @@ def api_request(
     params=None,
     timeout=None,
     stream=None,
+    headers=None,
+    body=None,
 ) -> requests.Response:
-    headers = {}
+    """Call the OPB API.
+
+    Identical concurrent calls to read-only endpoints share one upstream
+    request and get the same (already read) response object. While the
+    circuit breaker is open this raises UpstreamUnavailable at once.
+    """
+    headers = dict(headers or {})
+    name = endpoint_name(endpoint)
+    key = None
+    if not stream and files is None and body is None:
+        key = single_flight_key(name, endpoint, method, id_token, data, params, headers)
     if id_token:
         headers["Authorization"] = f"Bearer {id_token}"
+    trace_id = current_trace_id()
+    if trace_id:
+        headers[TRACE_HEADER] = trace_id
     url = f"{api_url}/{endpoint}"
-    logger.info("Making %s request to /%s", method, endpoint)
-    if method == "GET":
-        return requests.get(url, headers=headers, params=data, timeout=timeout, stream=stream)
-    elif method == "DELETE":
-        return requests.delete(url, headers=headers, json=data, timeout=timeout, stream=stream)
-    return requests.post(url, headers=headers, json=data, files=files, params=params, timeout=timeout, stream=stream)
+    if timeout is None:
+        timeout = ENDPOINT_TIMEOUTS.get(name, DEFAULT_TIMEOUT)
+
+    def send():
+        if not breaker.allow():
+            observe_circuit_open(name or "root")
+            raise UpstreamUnavailable(f"OPB API is unavailable, not calling /{endpoint}")
+        client = get_client(retry=name in IDEMPOTENT_ENDPOINTS)
+        logger.info("Making %s request to /%s", method, endpoint)
+        start = time.monotonic()
+        try:
+            if method == "GET":
+                r = client.get(url, headers=headers, params=data, timeout=timeout, stream=stream)
+            elif method == "DELETE":
+                r = client.delete(url, headers=headers, json=data, timeout=timeout, stream=stream)
+            else:
+                r = client.post(
+                    url, headers=headers, json=data, data=body, files=files, params=params, timeout=timeout, stream=stream
+                )
+        except Exception as e:
+            observe_upstream(name or "root", method, time.monotonic() - start, error=e)
+            upstream_failed = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+            breaker.record(False if upstream_failed else None)
+            raise
+        observe_upstream(name or "root", method, time.monotonic() - start, status=r.status_code)
+        breaker.record(r.status_code not in UNAVAILABLE_STATUSES)
+        return r
+
+    if key is None:
+        return send()
+    # Who actually sent the request: this call, this worker or another worker
+    sent = []
+
+    def send_portable():
+        sent.append("shared")
+        return dump_response(send())
+
+    def lead():
+        if _shared_calls is None:
+            sent.append("worker")
+            return send()
+        r = load_response(_shared_calls.do(key, send_portable))
+        if not sent:
+            observe_coalesced(name or "root", "shared")
+            sent.append("worker")
+        return r
+
+    r = _calls.do(key, lead)
+    if not sent:
+        observe_coalesced(name or "root", "worker")
+    return r
+
+
+def abort_response(r):
+    """Close a streamed response from another thread, so the OPB API stops sending.
+
+    Closing alone neither wakes a thread blocked reading the body nor tells
+    upstream, so the socket is shut down first.
+    """
+    sock = getattr(r.raw.connection, "sock", None) if r.raw is not None else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    r.close()
+
+
+def iter_fan_out(func, items, max_workers, deadline=None, timeout=None):
+    """Call ``func(item)`` for each item on a pool of threads.
+
+    Yields ``(item, result, error)`` as calls finish. At most ``max_workers``
+    calls are in flight, so at most that many results are held at once. Items
+    that haven't finished ``deadline`` seconds after the first call get a
+    ``TimeoutError`` and are abandoned, as does a call still running
+    ``timeout`` seconds after it started. Its slot goes to the next item on a
+    new thread. Calls run in a copy of the caller's context, so they see the
+    current request (trace id and timings).
+    """
+    items = list(dict.fromkeys(items))
+    if not items:
+        return
+    end = None if deadline is None else time.monotonic() + deadline
+    started = {}
+
+    def run(item):
+        started[item] = time.monotonic()
+        return func(item)
+
+    def submit(item):
+        pending[executor.submit(copy_context().run, run, item)] = item
+
+    queue = iter(items)
+    pending = {}
+    # An abandoned call keeps its thread, so with a timeout the pool may grow by one
+    # thread per abandoned call. Threads are only started when none is idle.
+    threads = len(items) if timeout is not None else min(max_workers, len(items))
+    executor = ThreadPoolExecutor(max_workers=max(1, threads))
+    try:
+        for item in islice(queue, max_workers):
+            submit(item)
+        while pending:
+            now = time.monotonic()
+            wait_for = None if end is None else max(0, end - now)
+            if timeout is not None:
+                # A call submitted but not yet started has no start time, so check again later
+                expiry = min((started[item] + timeout for item in pending.values() if item in started), default=now + timeout)
+                wait_for = max(0, expiry - now) if wait_for is None else min(wait_for, max(0, expiry - now))
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                for next_item in islice(queue, 1):
+                    submit(next_item)
+                error = future.exception()
+                yield item, None if error else future.result(), error
+            if timeout is not None:
+                now = time.monotonic()
+                for future, item in list(pending.items()):
+                    if item in started and now - started[item] >= timeout and not future.done():
+                        del pending[future]
+                        for next_item in islice(queue, 1):
+                            submit(next_item)
+                        yield item, None, TimeoutError(f"No result after {timeout}s")
+            if end is not None and time.monotonic() >= end:
+                break
+        for item in [*pending.values(), *queue]:
+            yield item, None, TimeoutError(f"No result after {deadline}s")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def fan_out(func, items, max_workers, deadline):
+    """Like ``iter_fan_out`` but waits for every item and returns a dict
+    mapping each one to ``(result, None)`` or ``(None, error)``.
+    """
+    return {item: (result, error) for item, result, error in iter_fan_out(func, items, max_workers, deadline)}
+
+
+class _ChunkWriter(io.RawIOBase):
+    """Unseekable file object that collects written bytes until drained."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_zip(files):
+    """Build a zip archive from ``(name, bytes)`` pairs, yielding it in pieces
+    as each file is added so the archive is never held in memory.
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+            yield writer.drain()
+    yield writer.drain()
+
+
+@lru_cache(maxsize=256)
+def compile_keyword(keyword):
+    """Compile one pattern matching the full keyword phrase or any of its words.
+
+    The phrase comes first in the alternation, so wherever it occurs it wins
+    over its individual words and a single left-to-right scan marks each
+    span once.
+    """
+    words = list(dict.fromkeys(keyword.split()))
+    if not words:
+        return None
+    alternatives = [re.escape(keyword)] + [re.escape(word) for word in words]
+    return re.compile(r"\b(?:" + "|".join(alternatives) + r")\b", re.IGNORECASE)
+
+
+def _mark(match):
+    return f"<mark>{match.group()}</mark>"
 
 
 def mark_keyword(text, keyword):
-    # Split the keyword into individual words
-    keywords = keyword.split()
-
-    # Create a pattern to match the full keyword phrase first
-    phrases_pattern = r"\b" + re.escape(keyword) + r"\b"
-    phrases_compiled = re.compile(phrases_pattern, re.IGNORECASE)
-
-    def replace_func(match):
-        return f"<mark>{match.group()}</mark>"
-
-    # First, mark the full keyword phrase
-    text = phrases_compiled.sub(replace_func, text)
-
-    # Create a pattern to match individual words only if they are standalone
-    words_pattern = r"\b" + r"\b|\b".join(re.escape(word) for word in keywords) + r"\b"
-    words_compiled = re.compile(words_pattern, re.IGNORECASE)
-
-    # Mark individual words only if the full phrase is not marked
-    return words_compiled.sub(
-        lambda match: match.group()
-        if f"<mark>{match.group()}</mark>" in text
-        else replace_func(match), text,
-    )
+    pattern = compile_keyword(keyword)
+    if pattern is None:
+        return text
+    return pattern.sub(_mark, text)
 
 
 def format_summary(summary):
@@ -150,10 +482,18 @@ def format_summary(summary):
     return "<br>".join(formatted_lines)
 
 
+def render_markdown(text):
+    # Imported here so workers boot without it; only sources with AI summaries need it
+    from markdown import markdown
+
+    return markdown(text)
+
+
 def generate_source_context(source, index, entities, keyword=None):
     source_type = source["type"]
     context = {
         "index": index + 1,
+        "id": source["id"],
         "type": source_type,
         "entities": process_entities(entities, keyword=keyword),
         "num_entities": len(entities),
@@ -161,6 +501,8 @@ def generate_source_context(source, index, entities, keyword=None):
     meta = entities[0]["metadata"]
     if source_type == "opinion":
         context.update({
+            # The resource ID the summary endpoint takes
+            "opinion_id": source["id"],
             "case_name": truncate_text(meta.get("case_name", ""), 150),
             "court_name": meta.get("court_name", ""),
             "url": f"https://www.courtlistener.com/opinion/{meta.get('cluster_id', '')}/{meta.get('slug', '')}",
@@ -168,7 +510,7 @@ def generate_source_context(source, index, entities, keyword=None):
             "opinion_type": get_opinion_type(meta.get("type", "")),
             "download_url": meta.get("download_url"),
             "courtlistener_summary": meta.get("summary"),
-            "ai_summary": markdown(meta.get("ai_summary", "")) if meta.get("ai_summary") else None,
+            "ai_summary": render_markdown(meta["ai_summary"]) if meta.get("ai_summary") else None,
             "other_dates": meta.get("other_dates")
         })
     elif source_type == "url":
@@ -176,7 +518,7 @@ def generate_source_context(source, index, entities, keyword=None):
             "url": source["id"],
             "source": meta.get("source", source["id"]),
             "title": meta.get("title", "Title Not Found"),
-            "ai_summary": markdown(meta.get("ai_summary", "")) if meta.get("ai_summary") else None,
+            "ai_summary": render_markdown(meta["ai_summary"]) if meta.get("ai_summary") else None,
         })
         epoch_time = meta.get("timestamp", None)
         if epoch_time:
@@ -263,31 +605,53 @@ def format_date(date_string):
     return f"{months[int(month) - 1]} {int(day)}, {year}"
 
 
-def organize_sources(new_sources):
-    source_map = {}
+class SourceGroups:
+    """Groups result chunks by source in first-seen order.
+
+    Chunks can be added as they arrive. Each source keeps a set of entity
+    PKs, so duplicates are dropped in O(1), and its entities are sorted by
+    PK only when ``groups()`` is called after an out-of-order add. The
+    caller's dicts are never modified.
+    """
 
-    for new_source in new_sources:
+    def __init__(self, new_sources=()):
+        self._groups = {}
+        self._pks = {}
+        self._unsorted = set()
+        for new_source in new_sources:
+            self.add(new_source)
+
+    def add(self, new_source):
         source_id = new_source["id"]
         entity = new_source["entity"]
-        del new_source["entity"]
-
-        if source_id in source_map:
-            # Check for existing entity with same PK
-            existing_entities = source_map[source_id]["entities"]
-            if not any(e["pk"] == entity["pk"] for e in existing_entities):
-                existing_entities.append(entity)
-        else:
-            source_map[source_id] = {
-                "source": new_source,
-                "entities": [entity],
-                "original_index": len(source_map),  # Maintain insertion order
+        group = self._groups.get(source_id)
+        if group is None:
+            group = {
+                "source": {key: value for key, value in new_source.items() if key != "entity"},
+                "entities": [],
+                "original_index": len(self._groups),  # Maintain insertion order
             }
+            self._groups[source_id] = group
+            self._pks[source_id] = set()
+        pks = self._pks[source_id]
+        if entity["pk"] in pks:
+            return
+        entities = group["entities"]
+        if entities and entity["pk"] < entities[-1]["pk"]:
+            self._unsorted.add(source_id)
+        pks.add(entity["pk"])
+        entities.append(entity)
+
+    def __len__(self):
+        return len(self._groups)
+
+    def groups(self):
+        """Return the sources in insertion order, each with its entities sorted by PK."""
+        for source_id in self._unsorted:
+            self._groups[source_id]["entities"].sort(key=lambda x: x["pk"])
+        self._unsorted.clear()
+        return list(self._groups.values())
 
-    # Sort sources by original insertion order
-    sorted_sources = sorted(source_map.values(), key=lambda x: x["original_index"])
-
-    # Sort entities within each source by their PK
-    for source_data in sorted_sources:
-        source_data["entities"].sort(key=lambda x: x["pk"])
 
-    return sorted_sources
+def organize_sources(new_sources):
+    return SourceGroups(new_sources).groups()
@@ -0,0 +1,3 @@
+"""Benchmarks for the agent UI. Run them from the repository root, e.g.
+``python -m benchmarks.bench_chat_streams``.
+"""
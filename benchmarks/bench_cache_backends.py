@@ -0,0 +1,40 @@
+"""Per-operation cost of the memory and SQLite cache backends.
+
+    python -m benchmarks.bench_cache_backends
+
+The SQLite backend trades a few microseconds per lookup for one copy of
+each entry per host instead of one per worker.
+"""
+import os
+import tempfile
+import timeit
+
+os.environ.setdefault("OPB_CACHE_DIR", tempfile.mkdtemp(prefix="opb-bench-cache-"))
+
+from cache import new_cache  # noqa: E402
+
+ENTRIES = 1000
+VALUE = {"data": {"name": "bot", "search_tools": [{"name": "courtlistener", "prompt": "x" * 500}]}}
+
+
+def run(backend, number=5000):
+    cache = new_cache(f"bench_{backend}", ttl=3600, max_entries=ENTRIES, backend=backend)
+    keys = [("bot", i) for i in range(ENTRIES)]
+    for key in keys:
+        cache.set(key, VALUE)
+    hit = min(timeit.repeat(lambda: cache.get(keys[7]), number=number, repeat=3)) / number
+    miss = min(timeit.repeat(lambda: cache.get(("missing", 0)), number=number, repeat=3)) / number
+    write = min(timeit.repeat(lambda: cache.set(keys[7], VALUE), number=number // 10, repeat=3)) / (number // 10)
+    many = min(timeit.repeat(lambda: cache.get_many(keys[:50]), number=number // 10, repeat=3)) / (number // 10)
+    return hit, miss, write, many
+
+
+def main():
+    print(f"{'backend':<8} {'hit us':>8} {'miss us':>8} {'set us':>8} {'get_many(50) us':>16}")
+    for backend in ("memory", "sqlite"):
+        hit, miss, write, many = run(backend)
+        print(f"{backend:<8} {hit * 1e6:>8.1f} {miss * 1e6:>8.1f} {write * 1e6:>8.1f} {many * 1e6:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""How many concurrent /chat streams a single worker holds.
+
+Starts the OPB stub and the UI under gunicorn with one worker, opens N
+streams at once and reports how many completed, how long they took and the
+peak number that were open at the same time::
+
+    python -m benchmarks.bench_chat_streams --worker-class gevent --streams 10 100 1000
+    python -m benchmarks.bench_chat_streams --worker-class sync --streams 2 4 8
+
+With ``OPB_STUB_TOKENS=50`` and ``OPB_STUB_TOKEN_INTERVAL=0.05`` an
+unobstructed stream takes about 2.5s, so wall time close to that at every
+level means the worker is not the bottleneck.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import time  # noqa: E402
+
+import gevent  # noqa: E402
+import requests  # noqa: E402
+from gevent.pool import Pool  # noqa: E402
+
+from benchmarks.harness import (  # noqa: E402
+    SECRET_KEY,
+    free_port,
+    percentile,
+    session_cookie,
+    start_gunicorn,
+    stop,
+)
+
+
+class Counter:
+    def __init__(self):
+        self.open = 0
+        self.peak = 0
+
+
+def run_stream(url, cookie, counter, timeout):
+    start = time.monotonic()
+    events = 0
+    counter.open += 1
+    counter.peak = max(counter.peak, counter.open)
+    try:
+        with requests.get(url, cookies={"session": cookie}, stream=True, timeout=timeout) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if line.startswith(b"data:"):
+                    events += 1
+                    if b'"done"' in line:
+                        break
+    except requests.exceptions.RequestException:
+        return None
+    finally:
+        counter.open -= 1
+    return time.monotonic() - start, events
+
+
+def run_level(base_url, cookie, streams, timeout):
+    counter = Counter()
+    pool = Pool(streams)
+    url = f"{base_url}/chat?sessionId=bench&message=hello"
+    start = time.monotonic()
+    jobs = [pool.spawn(run_stream, url, cookie, counter, timeout) for _ in range(streams)]
+    gevent.joinall(jobs)
+    wall = time.monotonic() - start
+    results = [job.value for job in jobs if job.value]
+    durations = [duration for duration, _ in results]
+    return {
+        "streams": streams,
+        "completed": len(results),
+        "failed": streams - len(results),
+        "peak_open": counter.peak,
+        "wall_s": wall,
+        "p50_s": percentile(durations, 50),
+        "max_s": max(durations, default=0.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--worker-class", default="gevent")
+    parser.add_argument("--streams", type=int, nargs="+", default=[10, 100, 500, 1000])
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    stub_port, app_port = free_port(), free_port()
+    connections = str(max(args.streams) + 10)
+    stub = start_gunicorn("benchmarks.opb_stub:app", stub_port, extra_args=("--worker-connections", connections))
+    app = start_gunicorn(
+        "app:app",
+        app_port,
+        worker_class=args.worker_class,
+        env={
+            "OPB_API_URL": f"http://127.0.0.1:{stub_port}",
+            "FLASK_SECRET_KEY": SECRET_KEY,
+            "GUNICORN_WORKER_CONNECTIONS": connections,
+        },
+        extra_args=("-c", "gunicorn.conf.py"),
+    )
+    cookie = session_cookie()
+    try:
+        print(f"worker class: {args.worker_class}, 1 worker")
+        print(f"{'streams':>8} {'done':>6} {'failed':>6} {'peak':>6} {'wall s':>8} {'p50 s':>8} {'max s':>8}")
+        for streams in args.streams:
+            row = run_level(f"http://127.0.0.1:{app_port}", cookie, streams, args.timeout)
+            print(
+                f"{row['streams']:>8} {row['completed']:>6} {row['failed']:>6} {row['peak_open']:>6} "
+                f"{row['wall_s']:>8.2f} {row['p50_s']:>8.2f} {row['max_s']:>8.2f}"
+            )
+    finally:
+        stop(app)
+        stop(stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compare the single-pass keyword highlighter with the two-pass version it replaced.
+
+    python -m benchmarks.bench_mark_keyword
+"""
+import os
+import re
+import timeit
+
+os.environ.setdefault("OPB_API_URL", "http://127.0.0.1:9")
+
+from app_helper import mark_keyword  # noqa: E402
+from benchmarks.synthetic import opinion_text  # noqa: E402
+
+
+def legacy_mark_keyword(text, keyword):
+    keywords = keyword.split()
+    phrases_compiled = re.compile(r"\b" + re.escape(keyword) + r"\b", re.IGNORECASE)
+
+    def replace_func(match):
+        return f"<mark>{match.group()}</mark>"
+
+    text = phrases_compiled.sub(replace_func, text)
+    words_pattern = r"\b" + r"\b|\b".join(re.escape(word) for word in keywords) + r"\b"
+    words_compiled = re.compile(words_pattern, re.IGNORECASE)
+    return words_compiled.sub(
+        lambda match: match.group()
+        if f"<mark>{match.group()}</mark>" in text
+        else replace_func(match), text,
+    )
+
+
+CASES = [
+    # (description, words per chunk, chunks, keyword)
+    ("1 word, 100 x 300-word chunks", 300, 100, "court"),
+    ("3 words, 100 x 300-word chunks", 300, 100, "due process of"),
+    ("3 words, 10 x 5000-word opinions", 5000, 10, "due process of"),
+    ("5 words, 10 x 5000-word opinions", 5000, 10, "probable cause search warrant jury"),
+]
+
+
+def run_case(func, texts, keyword, number):
+    return min(timeit.repeat(lambda: [func(text, keyword) for text in texts], number=number, repeat=3)) / number
+
+
+def main():
+    print(f"{'case':<36} {'legacy ms':>10} {'single-pass ms':>15} {'speedup':>8}")
+    for description, words, chunks, keyword in CASES:
+        texts = [opinion_text(words, seed=i) for i in range(chunks)]
+        number = 3 if words > 1000 else 10
+        legacy = run_case(legacy_mark_keyword, texts, keyword, number)
+        current = run_case(mark_keyword, texts, keyword, number)
+        print(f"{description:<36} {legacy * 1000:>10.2f} {current * 1000:>15.2f} {legacy / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
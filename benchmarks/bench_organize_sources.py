@@ -0,0 +1,70 @@
+"""Compare SourceGroups-based organize_sources with the quadratic version it replaced.
+
+    python -m benchmarks.bench_organize_sources
+"""
+import copy
+import os
+import time
+
+os.environ.setdefault("OPB_API_URL", "http://127.0.0.1:9")
+
+from app_helper import organize_sources  # noqa: E402
+from benchmarks.synthetic import search_results  # noqa: E402
+
+
+def legacy_organize_sources(new_sources):
+    source_map = {}
+    for new_source in new_sources:
+        source_id = new_source["id"]
+        entity = new_source["entity"]
+        del new_source["entity"]
+        if source_id in source_map:
+            existing_entities = source_map[source_id]["entities"]
+            if not any(e["pk"] == entity["pk"] for e in existing_entities):
+                existing_entities.append(entity)
+        else:
+            source_map[source_id] = {
+                "source": new_source,
+                "entities": [entity],
+                "original_index": len(source_map),
+            }
+    sorted_sources = sorted(source_map.values(), key=lambda x: x["original_index"])
+    for source_data in sorted_sources:
+        source_data["entities"].sort(key=lambda x: x["pk"])
+    return sorted_sources
+
+
+CASES = [
+    # (description, chunks, sources)
+    ("search page: 100 chunks / 20 sources", 100, 20),
+    ("browse page: 500 chunks / 50 sources", 500, 50),
+    ("one big opinion: 500 chunks", 500, 1),
+    ("browse, large per_page: 5000 chunks / 10", 5000, 10),
+]
+
+
+def best_time(func, results, repeat):
+    """Best of ``repeat`` runs; the legacy function mutates its input, so each run gets a fresh copy."""
+    best = float("inf")
+    for _ in range(repeat):
+        batch = copy.deepcopy(results)
+        start = time.perf_counter()
+        func(batch)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'case':<42} {'legacy ms':>10} {'grouped ms':>11} {'speedup':>8}")
+    for description, chunks, sources in CASES:
+        results = search_results(chunks, sources, words=5, duplicates=0.2)
+        expected = legacy_organize_sources(copy.deepcopy(results))
+        assert organize_sources(copy.deepcopy(results)) == expected
+        repeat = 5 if chunks > 1000 else 20
+        legacy = best_time(legacy_organize_sources, results, repeat)
+        current = best_time(organize_sources, results, repeat)
+        print(f"{description:<42} {legacy * 1000:>10.3f} {current * 1000:>11.3f} {legacy / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Micro-benchmarks for the per-request rendering work in search() and manage().
+
+Times each app_helper step on synthetic opinion, url and file results
+(1 to 500 chunks of long text, multi-word keyword) and the whole pipeline
+from upstream results to rendered HTML. Reports ops/sec, ms/op and the
+memory allocated per call::
+
+    python -m benchmarks.bench_pipeline                 # print results
+    python -m benchmarks.bench_pipeline --save          # store them as the baseline
+    python -m benchmarks.bench_pipeline --compare       # diff against the baseline
+
+``--compare`` exits non-zero when any benchmark is slower than the baseline
+by more than ``--threshold`` percent. Baselines are machine specific:
+regenerate them on the machine that does the comparing.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+from html import escape
+
+os.environ.setdefault("OPB_API_URL", "http://127.0.0.1:9")
+os.environ.setdefault("FLASK_SECRET_KEY", "benchmark-secret")
+
+from flask import render_template  # noqa: E402
+from markdown import markdown  # noqa: E402
+
+from app import app  # noqa: E402
+from app_helper import (  # noqa: E402
+    JURISDICTIONS,
+    generate_source_context,
+    mark_keyword,
+    organize_sources,
+    process_entities,
+)
+from benchmarks.harness import measure  # noqa: E402
+from benchmarks.synthetic import search_results  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "pipeline.json")
+KEYWORD = "due process of law"
+
+CASES = {
+    # name: (chunks, sources, source type)
+    "opinion-1": (1, 1, "opinion"),
+    "opinion-100": (100, 20, "opinion"),
+    "opinion-500": (500, 50, "opinion"),
+    "opinion-500-one-source": (500, 1, "opinion"),
+    "url-100": (100, 20, "url"),
+    "file-100": (100, 10, "file"),
+}
+
+
+def contexts(organized):
+    return [
+        generate_source_context(s["source"], i, s["entities"], keyword=KEYWORD)
+        for i, s in enumerate(organized)
+    ]
+
+
+def render(results, sources):
+    with app.test_request_context("/search/courtlistener"):
+        return render_template(
+            "search.html",
+            collection="courtlistener",
+            results=sources,
+            results_count=len(results),
+            form_data={"collection": "courtlistener", "query": "notice", "keyword_query": KEYWORD},
+            elapsed="0.1",
+            cached=False,
+            jurisdictions=JURISDICTIONS,
+            user={"email": "bench@openprobono.com", "firebase_uid": "bench-uid"},
+        )
+
+
+def benchmarks(results):
+    organized = organize_sources(results)
+    sources = contexts(organized)
+    texts = [escape(r["entity"]["text"]) for r in results]
+    summaries = [s["entities"][0]["metadata"].get("ai_summary") for s in organized]
+    summaries = [summary for summary in summaries if summary]
+    yield "organize_sources", lambda: organize_sources(results)
+    yield "generate_source_context", lambda: contexts(organized)
+    yield "process_entities", lambda: [process_entities(s["entities"], keyword=KEYWORD) for s in organized]
+    yield "mark_keyword", lambda: [mark_keyword(text, KEYWORD) for text in texts]
+    if summaries:
+        yield "markdown(ai_summary)", lambda: [markdown(summary) for summary in summaries]
+    yield "render search.html", lambda: render(results, sources)
+    yield "pipeline", lambda: render(results, contexts(organize_sources(results)))
+
+
+def run(selected):
+    measurements = {}
+    for case in selected:
+        chunks, sources, source_type = CASES[case]
+        results = search_results(chunks, sources, source_type=source_type, words=250, duplicates=0.1)
+        for name, func in benchmarks(results):
+            measurements[f"{case}/{name}"] = measure(func)
+    return measurements
+
+
+def print_table(measurements, baseline=None):
+    header = f"{'benchmark':<48} {'ops/s':>10} {'ms/op':>9} {'peak KiB':>9} {'kept KiB':>9}"
+    if baseline:
+        header += f" {'slower':>8}"
+    print(header)
+    regressions = []
+    for key, m in measurements.items():
+        line = (
+            f"{key:<48} {m['ops_per_sec']:>10.1f} {m['ms_per_op']:>9.3f} "
+            f"{m['peak_kib']:>9.1f} {m['retained_kib']:>9.1f}"
+        )
+        if baseline and key in baseline:
+            change = (baseline[key]["ops_per_sec"] / m["ops_per_sec"] - 1) * 100
+            line += f" {change:>+7.1f}%"
+            regressions.append((key, change))
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="run only these cases")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare the results with the baseline")
+    parser.add_argument("--threshold", type=float, default=20, help="slowdown in percent that fails --compare")
+    parser.add_argument("--baseline", default=BASELINE)
+    args = parser.parse_args()
+
+    measurements = run(args.case or list(CASES))
+    baseline = None
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = print_table(measurements, baseline)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": {key: {k: round(v, 4) for k, v in m.items()} for key, m in measurements.items()},
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+    slower = [(key, change) for key, change in regressions if change > args.threshold]
+    if slower:
+        print(f"\n{len(slower)} benchmark(s) more than {args.threshold}% slower than the baseline:")
+        for key, change in slower:
+            print(f"  {key}: {change:+.1f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
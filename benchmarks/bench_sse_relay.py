@@ -0,0 +1,81 @@
+"""Compare the SSE relay in sse.py with the decode-and-format loop it replaced.
+
+A simulated upstream produces chat tokens at a fixed rate, or as fast as
+possible for "burst". For each case the table shows tokens relayed per
+second, writes per token, and how long a token waits between leaving
+upstream and being written to the browser (mean and p99).
+
+    python -m benchmarks.bench_sse_relay
+"""
+import json
+import os
+import time
+
+os.environ.setdefault("OPB_API_URL", "http://127.0.0.1:9")
+
+import sse  # noqa: E402
+from benchmarks.harness import percentile  # noqa: E402
+
+
+def legacy_relay(lines):
+    for line in lines:
+        line = line.decode()
+        if line:
+            yield f"data: {line}\n\n".encode()
+
+
+def upstream(tokens, rate, produced):
+    interval = 1 / rate if rate else 0
+    start = time.perf_counter()
+    for i in range(tokens):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        line = json.dumps({"type": "response", "content": f"token{i} "}).encode()
+        produced.append(time.perf_counter())
+        yield line
+
+
+def run_case(relay, tokens, rate):
+    produced, waits = [], []
+    writes = 0
+    start = time.perf_counter()
+    for chunk in relay(upstream(tokens, rate, produced)):
+        now = time.perf_counter()
+        writes += 1
+        received = len(waits)
+        waits.extend(now - produced[i] for i in range(received, received + chunk.count(b"data: ")))
+    elapsed = time.perf_counter() - start
+    waits.sort()
+    return tokens / elapsed, writes / tokens, sum(waits) / len(waits), percentile(waits, 99)
+
+
+RELAYS = [
+    ("legacy", legacy_relay),
+    ("relay, no coalescing", lambda lines: sse.relay(lines, coalesce_window=0)),
+    ("relay, 10ms window", lambda lines: sse.relay(lines, coalesce_window=0.010)),
+    ("relay, 50ms window", lambda lines: sse.relay(lines, coalesce_window=0.050)),
+]
+
+CASES = [
+    # (description, tokens, tokens per second; 0 = as fast as possible)
+    ("burst", 20000, 0),
+    ("200 tok/s", 400, 200),
+    ("50 tok/s", 150, 50),
+]
+
+
+def main():
+    print(f"{'case':<12} {'relay':<22} {'tok/s':>10} {'writes/tok':>11} {'mean ms':>9} {'p99 ms':>8}")
+    for description, tokens, rate in CASES:
+        for name, relay in RELAYS:
+            throughput, writes, mean, p99 = run_case(relay, tokens, rate)
+            print(
+                f"{description:<12} {name:<22} {throughput:>10.0f} {writes:>11.2f} "
+                f"{mean * 1000:>9.2f} {p99 * 1000:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
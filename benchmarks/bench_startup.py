@@ -0,0 +1,97 @@
+"""Time from starting gunicorn to the first request served, per startup profile.
+
+Starts the OPB stub, then the UI with ``gunicorn.conf.py`` under each
+profile, and reports:
+
+* ready: seconds from spawning gunicorn until the first page answers 200,
+* first: the first request to each template-heavy page right after that,
+  which is where lazily compiled templates show up.
+
+``lazy`` is the old behaviour (no preload, templates compiled on first
+use). ``preload`` is the production profile, run twice. The second run
+starts with the Jinja bytecode cache the first one left behind::
+
+    python -m benchmarks.bench_startup --workers 2 --runs 3
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.harness import SECRET_KEY, free_port, session_cookie, start_gunicorn, stop
+
+PAGES = ["/dashboard", "/sessions-page", "/search/courtlistener?semantic=due+process", "/agents"]
+PROFILES = [
+    ("lazy", {"GUNICORN_PRELOAD": "false", "OPB_PRECOMPILE_TEMPLATES": "false"}, False),
+    ("preload, cold", {"GUNICORN_PRELOAD": "true", "OPB_PRECOMPILE_TEMPLATES": "true"}, False),
+    ("preload, warm", {"GUNICORN_PRELOAD": "true", "OPB_PRECOMPILE_TEMPLATES": "true"}, True),
+]
+
+
+def boot(env, workers, cookies):
+    port = free_port()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}", "-w", str(workers), "app:app"]
+    start = time.monotonic()
+    proc = subprocess.Popen(cmd, cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with code {proc.returncode}")
+            try:
+                if requests.get(base + PAGES[0], cookies=cookies, timeout=30).status_code == 200:
+                    break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.01)
+        ready = time.monotonic() - start
+        first = []
+        for page in PAGES[1:]:
+            t = time.monotonic()
+            requests.get(base + page, cookies=cookies, timeout=30).raise_for_status()
+            first.append(time.monotonic() - t)
+        return ready, first
+    finally:
+        stop(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = start_gunicorn("benchmarks.opb_stub:app", stub_port)
+    cookies = {"session": session_cookie()}
+    try:
+        print(f"{'profile':<16} {'ready ms':>9} " + " ".join(f"{page.split('?')[0][:16]:>17}" for page in PAGES[1:]))
+        results = {name: [] for name, _, _ in PROFILES}
+        for _ in range(args.runs):
+            for name, profile, warm in PROFILES:
+                if not warm:
+                    cache_dir = tempfile.mkdtemp(prefix="opb-bench-startup-")
+                env = {
+                    **os.environ,
+                    **profile,
+                    "OPB_API_URL": f"http://127.0.0.1:{stub_port}",
+                    "FLASK_SECRET_KEY": SECRET_KEY,
+                    # A warm profile reuses the bytecode cache of the one before it
+                    "OPB_CACHE_DIR": cache_dir,
+                    "PROMETHEUS_MULTIPROC_DIR": tempfile.mkdtemp(prefix="opb-bench-metrics-"),
+                }
+                results[name].append(boot(env, args.workers, cookies))
+        for name, runs in results.items():
+            ready = min(r for r, _ in runs)
+            first = [min(f[i] for _, f in runs) for i in range(len(PAGES) - 1)]
+            print(f"{name:<16} {ready * 1000:>9.0f} " + " ".join(f"{f * 1000:>14.1f} ms" for f in first))
+    finally:
+        stop(stub)
+
+
+if __name__ == "__main__":
+    main()
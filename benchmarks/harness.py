@@ -0,0 +1,108 @@
+"""Helpers shared by the benchmarks: free ports, server processes and login cookies."""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import requests
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+SECRET_KEY = "benchmark-secret"
+USER = {"id_token": "benchmark-token", "email": "bench@openprobono.com", "firebase_uid": "bench-uid"}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def session_cookie(data=None, secret_key=SECRET_KEY):
+    """Sign a Flask session cookie so requests look logged in."""
+    app = Flask(__name__)
+    app.secret_key = secret_key
+    serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+    return serializer.dumps(data or USER)
+
+
+def start_gunicorn(target, port, worker_class="gevent", workers=1, env=None, extra_args=()):
+    """Start ``gunicorn target`` on ``port`` from the repository root and wait until it answers."""
+    cmd = [
+        sys.executable, "-m", "gunicorn",
+        "-b", f"127.0.0.1:{port}",
+        "-k", worker_class,
+        "-w", str(workers),
+        "--log-level", "warning",
+        *extra_args,
+        target,
+    ]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # gunicorn.conf.py in the root is always loaded and patches for gevent by this
+    proc_env = {**os.environ, "GUNICORN_WORKER_CLASS": worker_class, **(env or {})}
+    proc = subprocess.Popen(cmd, cwd=root, env=proc_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until_up(f"http://127.0.0.1:{port}/", proc)
+    return proc
+
+
+def wait_until_up(url, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            requests.get(url, timeout=1, allow_redirects=False)
+            return
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+def stop(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, round(pct / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def measure(func, repeat=3):
+    """Time ``func()`` and trace its allocations.
+
+    Returns ops/sec and ms/op from the best of ``repeat`` timing rounds,
+    plus the peak KiB allocated during one call and the KiB it left allocated.
+    """
+    import timeit
+    import tracemalloc
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+        func()
+        snapshot_after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, "filename"))
+    return {
+        "ops_per_sec": 1 / best,
+        "ms_per_op": best * 1000,
+        "peak_kib": (peak - before) / 1024,
+        "retained_kib": retained / 1024,
+    }
@@ -0,0 +1,156 @@
+"""Route-level load test of the UI against the local OPB stub.
+
+Starts ``benchmarks.opb_stub`` and the UI under gunicorn (using
+gunicorn.conf.py), drives a weighted mix of routes with N concurrent
+clients for a fixed time and reports p50/p95/p99 latency and throughput
+per route::
+
+    python -m benchmarks.loadtest --workers 2 --concurrency 50 --duration 30
+    python -m benchmarks.loadtest --worker-class sync --workers 4 --route search --route agents
+    OPB_STUB_LATENCY_SEARCH_COLLECTION=0.8 python -m benchmarks.loadtest
+
+Stub latency, payload size and token rate come from the OPB_STUB_*
+variables documented in benchmarks/opb_stub.py. Any other environment
+variable (OPB_*_CACHE_TTL, OPB_POOL_MAXSIZE, ...) is passed to the UI, so
+caching and pool settings can be compared offline. ``--url`` skips
+starting servers and load-tests a UI that is already running.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import itertools  # noqa: E402
+import random  # noqa: E402
+import time  # noqa: E402
+from collections import defaultdict  # noqa: E402
+
+import gevent  # noqa: E402
+import requests  # noqa: E402
+
+from benchmarks.harness import (  # noqa: E402
+    SECRET_KEY,
+    free_port,
+    percentile,
+    session_cookie,
+    start_gunicorn,
+    stop,
+)
+
+QUERIES = [
+    "due process notice hearing", "fourth amendment warrantless search", "tenant eviction notice",
+    "qualified immunity excessive force", "wage theft overtime", "custody best interests of the child",
+    "habeas corpus ineffective assistance", "fair housing disability accommodation",
+]
+
+# name: (weight, path factory, streams)
+ROUTES = {
+    "agents": (3, lambda rng: "/agents", False),
+    "chatbot": (3, lambda rng: f"/agent/bot{rng.randrange(5)}", False),
+    "agent_info": (3, lambda rng: f"/agent/bot{rng.randrange(5)}/info", False),
+    "sessions": (2, lambda rng: "/sessions?" + "&".join(f"ids[]=session{i}" for i in rng.sample(range(50), 10)), False),
+    "sessions_page": (1, lambda rng: "/sessions-page", False),
+    "search": (4, lambda rng: f"/search/courtlistener?semantic={rng.choice(QUERIES)}&keyword=due+process", False),
+    "manage": (1, lambda rng: f"/manage/courtlistener?page={rng.randrange(1, 4)}", False),
+    "resource_count": (3, lambda rng: "/resource_count/courtlistener", False),
+    "summary": (2, lambda rng: f"/summary/opinion-{rng.randrange(20)}", False),
+    "status": (2, lambda rng: "/status", False),
+    "chat": (1, lambda rng: f"/chat?sessionId=session{rng.randrange(50)}&message=hello", True),
+}
+
+
+def client(base_url, cookie, schedule, deadline, stats, seed):
+    rng = random.Random(seed)
+    http = requests.Session()
+    http.cookies.set("session", cookie)
+    for route in schedule:
+        if time.monotonic() >= deadline:
+            return
+        _, path, streams = ROUTES[route]
+        start = time.monotonic()
+        try:
+            with http.get(base_url + path(rng), stream=streams, timeout=120, allow_redirects=False) as r:
+                if streams:
+                    for _ in r.iter_content(chunk_size=None):
+                        pass
+                else:
+                    r.content  # noqa: B018
+                ok = r.status_code < 400
+        except requests.exceptions.RequestException:
+            ok = False
+        elapsed = time.monotonic() - start
+        if ok:
+            stats[route].append(elapsed)
+        else:
+            stats[f"{route} (errors)"].append(elapsed)
+
+
+def make_schedule(routes, seed):
+    rng = random.Random(seed)
+    weights = [ROUTES[route][0] for route in routes]
+    return (rng.choices(routes, weights)[0] for _ in itertools.count())
+
+
+def report(stats, duration):
+    print(f"{'route':<26} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    total = 0
+    for route in sorted(stats):
+        latencies = stats[route]
+        total += len(latencies)
+        print(
+            f"{route:<26} {len(latencies):>9} {len(latencies) / duration:>8.1f} "
+            f"{percentile(latencies, 50) * 1000:>9.1f} {percentile(latencies, 95) * 1000:>9.1f} "
+            f"{percentile(latencies, 99) * 1000:>9.1f}"
+        )
+    print(f"{'total':<26} {total:>9} {total / duration:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2, help="UI gunicorn workers")
+    parser.add_argument("--worker-class", default="gevent", help="UI gunicorn worker class")
+    parser.add_argument("--stub-workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--route", action="append", choices=sorted(ROUTES), help="only drive these routes")
+    parser.add_argument("--url", help="load-test a running UI instead of starting one")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    servers = []
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            stub_port, app_port = free_port(), free_port()
+            servers.append(start_gunicorn("benchmarks.opb_stub:app", stub_port, workers=args.stub_workers))
+            servers.append(start_gunicorn(
+                "app:app",
+                app_port,
+                worker_class=args.worker_class,
+                workers=args.workers,
+                env={"OPB_API_URL": f"http://127.0.0.1:{stub_port}", "FLASK_SECRET_KEY": SECRET_KEY},
+                extra_args=("-c", "gunicorn.conf.py"),
+            ))
+            base_url = f"http://127.0.0.1:{app_port}"
+
+        routes = args.route or list(ROUTES)
+        cookie = session_cookie()
+        stats = defaultdict(list)
+        start = time.monotonic()
+        deadline = start + args.duration
+        clients = [
+            gevent.spawn(client, base_url, cookie, make_schedule(routes, args.seed + i), deadline, stats, args.seed + i)
+            for i in range(args.concurrency)
+        ]
+        gevent.joinall(clients)
+        elapsed = time.monotonic() - start
+        print(f"{args.workers} x {args.worker_class} workers, {args.concurrency} clients, {elapsed:.1f}s")
+        report(stats, elapsed)
+    finally:
+        for server in reversed(servers):
+            stop(server)
+
+
+if __name__ == "__main__":
+    main()
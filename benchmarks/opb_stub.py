@@ -0,0 +1,185 @@
+"""Local stand-in for the OPB API, for benchmarks and load tests.
+
+Implements the endpoints app.py calls with synthetic data. Serve it with
+``gunicorn -k gevent benchmarks.opb_stub:app``. Configure it from the
+environment:
+
+* ``OPB_STUB_LATENCY``: seconds every endpoint waits before answering.
+* ``OPB_STUB_LATENCY_<ENDPOINT>``: per-endpoint override, e.g.
+  ``OPB_STUB_LATENCY_SEARCH_COLLECTION=0.8`` or ``OPB_STUB_LATENCY_RESOURCE_COUNT=5``.
+* ``OPB_STUB_RESULTS``: chunks returned by search_collection/browse_collection.
+* ``OPB_STUB_SOURCES``: sources those chunks are spread over.
+* ``OPB_STUB_CHUNK_WORDS``: words per chunk, which sets the payload size.
+* ``OPB_STUB_SESSIONS``: sessions returned by fetch_sessions.
+* ``OPB_STUB_MESSAGES``: messages in each session history.
+* ``OPB_STUB_TOKENS``: tokens sent per ``chat_session_stream`` answer.
+* ``OPB_STUB_TOKEN_INTERVAL``: seconds between streamed tokens.
+"""
+import os
+import time
+from functools import lru_cache
+from json import dumps
+
+from flask import Flask, Response, request
+
+from benchmarks.synthetic import opinion_text, search_results
+
+LATENCY = float(os.environ.get("OPB_STUB_LATENCY", 0.02))
+RESULTS = int(os.environ.get("OPB_STUB_RESULTS", 100))
+SOURCES = int(os.environ.get("OPB_STUB_SOURCES", 20))
+CHUNK_WORDS = int(os.environ.get("OPB_STUB_CHUNK_WORDS", 250))
+SESSIONS = int(os.environ.get("OPB_STUB_SESSIONS", 50))
+MESSAGES = int(os.environ.get("OPB_STUB_MESSAGES", 20))
+TOKENS = int(os.environ.get("OPB_STUB_TOKENS", 50))
+TOKEN_INTERVAL = float(os.environ.get("OPB_STUB_TOKEN_INTERVAL", 0.05))
+
+BOTS = {
+    f"bot{i}": {
+        "name": f"Research Agent {i}",
+        "created_at": "2024-05-01T12:00:00",
+        "search_tools": [{"name": "search", "method": "serpapi", "prefix": "", "prompt": "Search the web."}],
+        "vdb_tools": [{"name": "cases", "collection_name": "courtlistener", "k": 4, "prompt": "Search cases."}],
+        "chat_model": {"engine": "openai", "model": "gpt-4o", "temperature": 0, "seed": 0},
+        "system_prompt": "You are a legal research assistant.",
+    }
+    for i in range(5)
+}
+
+app = Flask(__name__)
+
+
+def delay(endpoint):
+    time.sleep(float(os.environ.get(f"OPB_STUB_LATENCY_{endpoint.upper()}", LATENCY)))
+
+
+@lru_cache(maxsize=4)
+def results_payload(kind):
+    results = search_results(RESULTS, SOURCES, words=CHUNK_WORDS, duplicates=0.1)
+    for result in results:
+        del result["source_index"]
+    if kind == "browse":
+        return dumps({"results": results, "has_next": True})
+    return dumps({"results": results})
+
+
+def session_record(session_id):
+    return {
+        "session_id": session_id,
+        "title": f"Research session {session_id}",
+        "timestamp": "2024-05-01T12:00:00Z",
+        "bot_id": "bot0",
+    }
+
+
+@app.route("/", methods=["GET"])
+def root():
+    delay("root")
+    return {"message": "API is alive"}
+
+
+@app.route("/view_bots", methods=["POST"])
+def view_bots():
+    delay("view_bots")
+    return {"message": "Success", "data": BOTS}
+
+
+@app.route("/view_bot", methods=["POST"])
+def view_bot():
+    delay("view_bot")
+    bot = BOTS.get(request.args.get("bot_id"))
+    return {"message": "Success" if bot else "Failure: bot not found", "data": bot}
+
+
+@app.route("/create_bot", methods=["POST"])
+def create_bot():
+    delay("create_bot")
+    return {"message": "Success", "bot_id": "bot0"}
+
+
+@app.route("/delete_bot/<bot_id>", methods=["DELETE"])
+def delete_bot(bot_id):
+    delay("delete_bot")
+    return {"message": "Success"}
+
+
+@app.route("/search_collection", methods=["POST"])
+def search_collection():
+    delay("search_collection")
+    return Response(results_payload("search"), mimetype="application/json")
+
+
+@app.route("/browse_collection", methods=["POST"])
+def browse_collection():
+    delay("browse_collection")
+    return Response(results_payload("browse"), mimetype="application/json")
+
+
+@app.route("/resource_count/<collection>", methods=["GET"])
+def resource_count(collection):
+    delay("resource_count")
+    return {"message": "Success", "resource_count": 1000000}
+
+
+@app.route("/summary", methods=["GET"])
+def summary():
+    delay("summary")
+    return {"message": "Success", "result": "- **Holding**: " + opinion_text(80, seed=len(request.args.get("resource_id", "")))}
+
+
+@app.route("/initialize_session", methods=["POST"])
+def initialize_session():
+    delay("initialize_session")
+    return {"message": "Success", "session_id": "session0"}
+
+
+@app.route("/fetch_session", methods=["POST"])
+def fetch_session():
+    delay("fetch_session")
+    return session_record(request.json["session_id"])
+
+
+@app.route("/fetch_sessions", methods=["POST"])
+def fetch_sessions():
+    delay("fetch_sessions")
+    return {"message": "Success", "sessions": [session_record(f"session{i}") for i in range(SESSIONS)]}
+
+
+@app.route("/fetch_session_formatted_history", methods=["POST"])
+def fetch_session_formatted_history():
+    delay("fetch_session_formatted_history")
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": opinion_text(60, seed=i)}
+        for i in range(MESSAGES)
+    ]
+    return {"message": "Success", "history": history}
+
+
+@app.route("/session_feedback", methods=["POST"])
+def session_feedback():
+    delay("session_feedback")
+    return {"message": "Success"}
+
+
+@app.route("/upload_files", methods=["POST"])
+def upload_files():
+    delay("upload_files")
+    results = [{"id": f.filename, "message": "Success"} for f in request.files.getlist("files")]
+    return {"message": "Success", "results": results}
+
+
+@app.route("/get_user_datasets", methods=["GET"])
+def get_user_datasets():
+    delay("get_user_datasets")
+    return {"message": "Success", "datasets": []}
+
+
+@app.route("/chat_session_stream", methods=["POST"])
+def chat_session_stream():
+    delay("chat_session_stream")
+
+    def generate():
+        for i in range(TOKENS):
+            time.sleep(TOKEN_INTERVAL)
+            yield dumps({"type": "response", "content": f"token{i} "}) + "\n"
+
+    return Response(generate(), mimetype="text/plain")
@@ -0,0 +1,86 @@
+"""Synthetic CourtListener-like data for the benchmarks."""
+import random
+
+VOCABULARY = (
+    "the court held that due process of law requires notice and an opportunity to be heard "
+    "plaintiff defendant appellant appellee motion summary judgment reversed affirmed remanded "
+    "statute constitution amendment jurisdiction federal state claim damages injunction evidence "
+    "testimony witness jury verdict trial appeal circuit district opinion dissent concurrence "
+    "contract tort negligence liability property search seizure warrant probable cause standing"
+).split()
+
+
+def opinion_text(words, seed=0):
+    """Return ``words`` words of opinion-like prose, broken into paragraphs."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(words):
+        word = rng.choice(VOCABULARY)
+        if i % 12 == 0:
+            word = word.capitalize()
+        out.append(word)
+        if i % 120 == 119:
+            out.append(".\n\n")
+        elif i % 12 == 11:
+            out.append(".")
+    return " ".join(out)
+
+
+def source_metadata(source_type, index, rng):
+    if source_type == "opinion":
+        return {
+            "case_name": f"Doe v. Roe {index}",
+            "court_name": "Court of Appeals for the Fourth Circuit",
+            "cluster_id": 1000 + index,
+            "slug": f"doe-v-roe-{index}",
+            "author_name": "Judge Smith",
+            "date_filed": f"20{rng.randint(10, 24)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+            "type": "010combined",
+            "download_url": f"https://example.com/opinions/{index}.pdf",
+            "summary": "The court affirmed.",
+            "ai_summary": "**Holding**: The court *affirmed* the judgment.\n\n- Point one\n- Point two",
+        }
+    if source_type == "url":
+        return {
+            "source": "example.com",
+            "title": f"Know your rights, part {index}",
+            "timestamp": 1700000000 + index,
+            "ai_summary": "A short **summary** of the page.",
+        }
+    return {"timestamp": 1700000000 + index, "page_number": rng.randint(1, 40)}
+
+
+def source_id(source_type, index):
+    if source_type == "url":
+        return f"https://example.com/rights/{index}"
+    if source_type == "file":
+        return f"exhibit_{index}.pdf"
+    return f"opinion-{index}"
+
+
+def search_results(chunks, sources=10, source_type="opinion", words=200, duplicates=0.0, seed=0):
+    """Return ``chunks`` search_collection results spread over ``sources`` sources.
+
+    Chunks arrive in random order and a ``duplicates`` fraction repeat an
+    earlier chunk's PK, as overlapping semantic and keyword hits do.
+    """
+    rng = random.Random(seed)
+    metadata = [source_metadata(source_type, i, rng) for i in range(sources)]
+    results = []
+    for pk in rng.sample(range(chunks * 4), chunks):
+        index = rng.randrange(sources)
+        if results and rng.random() < duplicates:
+            previous = rng.choice(results)
+            index, pk = previous["source_index"], previous["entity"]["pk"]
+        results.append({
+            "id": source_id(source_type, index),
+            "type": source_type,
+            "source_index": index,
+            "entity": {
+                "pk": pk,
+                "text": opinion_text(words, seed=pk),
+                "distance": rng.uniform(0.2, 1.2),
+                "metadata": metadata[index],
+            },
+        })
+    return results
@@ -0,0 +1,502 @@
+"""In-process and on-disk caches for upstream data that many pages ask for.
+
+Caches are created with ``new_cache``. OPB_CACHE_BACKEND picks where
+entries live: ``memory`` (the default) keeps an LRU per worker, and
+``sqlite`` keeps one database per cache that all workers on the host
+share, so each entry is fetched and stored once instead of once per
+worker. Both backends have the same methods and report per-cache stats
+at /cache_stats.
+"""
+import fcntl
+import hashlib
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from json import dumps, loads
+
+from metrics import observe_cache
+
+# The app logger, configured in app_helper
+logger = logging.getLogger("logger")
+
+# Every cache by name, for the stats endpoint
+caches = {}
+
+# Where on-disk caches keep their databases
+CACHE_DIR = os.environ.get("OPB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "opb-ui-cache"))
+# Databases of caches that don't persist, cleared when Gunicorn starts
+VOLATILE_DIR = os.path.join(CACHE_DIR, "volatile")
+BACKEND = os.environ.get("OPB_CACHE_BACKEND", "memory")
+PERSIST = os.environ.get("OPB_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+
+
+def private_dir(path=CACHE_DIR):
+    """Create ``path`` if needed and check that only this user can use it.
+
+    The caches load what they find there, so a directory that another user
+    owns raises PermissionError. So does any directory between ``CACHE_DIR``
+    and ``path``. A directory this user owns is tightened to mode 0700.
+    """
+    path = os.path.abspath(path)
+    root = os.path.abspath(CACHE_DIR)
+    chain = [path]
+    while chain[-1] != root and chain[-1].startswith(root + os.sep):
+        chain.append(os.path.dirname(chain[-1]))
+    os.makedirs(os.path.dirname(chain[-1]), exist_ok=True)
+    for directory in reversed(chain):
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+            raise PermissionError(f"{directory} is not a directory of this user, set OPB_CACHE_DIR to a private one")
+        if info.st_mode & 0o077:
+            os.chmod(directory, 0o700)
+    return path
+
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire ``ttl`` seconds after they are set.
+
+    With ``max_entries`` or ``max_bytes`` the least recently used entries
+    are evicted past that bound; entry sizes come from ``sizeof``, which
+    defaults to the length of the value's JSON encoding. With ``keep_stale``
+    expired entries stay around (until evicted) so callers can revalidate
+    them with ``get_stale``.
+    """
+
+    backend = "memory"
+
+    def __init__(self, name, ttl, max_entries=None, max_bytes=None, sizeof=None, keep_stale=False):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or json_size
+        self.keep_stale = keep_stale
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                hit = True
+            else:
+                if entry is not None and not self.keep_stale:
+                    self._remove(key)
+                self.misses += 1
+                hit = False
+        observe_cache(self.name, hit)
+        return entry[1] if hit else default
+
+    def get_many(self, keys):
+        """Return a dict of the unexpired entries among ``keys``."""
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def get_stale(self, key, default=None):
+        """Return the entry for ``key`` even if it has expired, without counting a lookup."""
+        with self._lock:
+            entry = self._data.get(key)
+            return default if entry is None else entry[1]
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while (self.max_entries is not None and len(self._data) > self.max_entries) or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._data)))
+
+    def set_many(self, entries):
+        for key, value in entries.items():
+            self.set(key, value)
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose key matches ``predicate``."""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+class SQLiteCache:
+    """TTL cache of JSON values in a SQLite database under ``CACHE_DIR``.
+
+    Every worker opens the same file, so entries are shared across workers.
+    With ``persist`` they also survive restarts. Otherwise the database is
+    under ``VOLATILE_DIR``, which the Gunicorn master clears on start. The
+    database runs in WAL mode, so readers never wait for a writer. Each
+    process has one connection, behind a lock, and opens a new one after a
+    fork. Keys are JSON-encoded, so tuples come back as lists.
+
+    ``max_entries``, ``max_bytes`` and ``keep_stale`` work as for TTLCache,
+    except that the entries closest to expiry (the oldest written) are
+    evicted first, so reads stay read-only. Expired entries are purged as
+    new ones are written. ``hits`` and ``misses`` count this worker's
+    lookups. /metrics has them for all workers.
+    """
+
+    backend = "sqlite"
+    PURGE_EVERY = 100
+    SCHEMA_VERSION = 2
+
+    def __init__(self, name, ttl, max_entries=None, max_bytes=None, keep_stale=False, persist=True, path=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.keep_stale = keep_stale
+        self.persist = persist
+        self.path = path or os.path.join(CACHE_DIR if persist else VOLATILE_DIR, f"{name}.sqlite3")
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        caches[name] = self
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            # Imported here so the memory backend never loads it
+            import sqlite3
+
+            private_dir(os.path.dirname(self.path))
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("BEGIN IMMEDIATE")
+            if db.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                db.execute("DROP TABLE IF EXISTS entries")
+                db.execute(
+                    "CREATE TABLE entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, size INTEGER NOT NULL)"
+                )
+                db.execute("CREATE INDEX entries_expires ON entries (expires)")
+                db.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            db.execute("COMMIT")
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        """Return a dict of the unexpired entries among ``keys``."""
+        encoded = {dumps(key): key for key in keys}
+        if not encoded:
+            return {}
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT key, value FROM entries WHERE expires > ? AND key IN ({', '.join('?' * len(encoded))})",
+                [time.time(), *encoded],
+            ).fetchall()
+            found = {encoded[key]: loads(value) for key, value in rows}
+            self.hits += len(found)
+            self.misses += len(encoded) - len(found)
+        for key in encoded.values():
+            observe_cache(self.name, key in found)
+        return found
+
+    def get_stale(self, key, default=None):
+        """Return the entry for ``key`` even if it has expired, without counting a lookup."""
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM entries WHERE key = ?", (dumps(key),)).fetchone()
+        return default if row is None else loads(row[0])
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, entries):
+        expires = time.time() + self.ttl
+        rows = []
+        for key, value in entries.items():
+            value = dumps(value)
+            if self.max_bytes is None or len(value) <= self.max_bytes:
+                rows.append((dumps(key), value, expires, len(value)))
+        if not rows:
+            return
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany("INSERT OR REPLACE INTO entries (key, value, expires, size) VALUES (?, ?, ?, ?)", rows)
+                self._evict(db)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def _evict(self, db):
+        self._writes += 1
+        if self._writes >= self.PURGE_EVERY and not self.keep_stale:
+            self._writes = 0
+            db.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+        if self.max_entries is not None:
+            db.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        if self.max_bytes is not None:
+            db.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM "
+                "(SELECT key, SUM(size) OVER (ORDER BY expires DESC, key) AS total FROM entries) WHERE total > ?)",
+                (self.max_bytes,),
+            )
+
+    def invalidate(self, key):
+        with self._lock:
+            self._connect().execute("DELETE FROM entries WHERE key = ?", (dumps(key),))
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose key matches ``predicate``."""
+        with self._lock:
+            db = self._connect()
+            keys = [key for (key,) in db.execute("SELECT key FROM entries") if predicate(loads(key))]
+            db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM entries")
+
+    def stats(self):
+        with self._lock:
+            size, total = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "size": size,
+                "max_entries": self.max_entries,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "file_bytes": os.path.getsize(self.path),
+                "path": self.path,
+                "persist": self.persist,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def new_cache(name, ttl, max_entries=None, max_bytes=None, keep_stale=False, backend=None, persist=None):
+    """Create a cache with the backend named by ``backend`` or OPB_CACHE_BACKEND.
+
+    ``memory`` keeps entries in this worker. ``sqlite`` shares them with
+    every worker on the host, and with ``persist`` (OPB_CACHE_PERSIST by
+    default) keeps them across restarts.
+    """
+    backend = backend or BACKEND
+    if backend == "memory":
+        return TTLCache(name, ttl, max_entries=max_entries, max_bytes=max_bytes, keep_stale=keep_stale)
+    if backend == "sqlite":
+        persist = PERSIST if persist is None else persist
+        return SQLiteCache(name, ttl, max_entries=max_entries, max_bytes=max_bytes, keep_stale=keep_stale, persist=persist)
+    raise ValueError(f"Unknown cache backend {backend!r}")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls for the same key into one.
+
+    The first caller for a key runs the function. Callers that arrive
+    while it is running wait for it and get the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def start(self, key, func):
+        """Run ``func`` for ``key`` in a background thread, unless a call is already in flight."""
+        with self._lock:
+            if key in self._calls:
+                return False
+
+        def run():
+            try:
+                self.do(key, func)
+            except Exception:
+                logger.exception("Background refresh of %r failed.", key)
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class SharedCallError(Exception):
+    """A call failed in the worker that made it for a FileSingleFlight."""
+
+
+class FileSingleFlight:
+    """Collapses identical calls across worker processes with lock files.
+
+    The first process to lock a key's file runs the function and leaves the
+    result (or the error's message) next to the lock as JSON, so the
+    function must return a JSON-serializable value. Processes that were
+    waiting for the lock read that result instead of calling again. A
+    failed call raises SharedCallError in them. Waiting polls, so a gevent
+    worker keeps serving other requests meanwhile. A waiter that gets no
+    lock within ``wait`` seconds calls the function itself. Results can
+    hold response bodies, so the directory must be private (see
+    ``private_dir``) and results are swept ``keep`` seconds after they were
+    written.
+    """
+
+    POLL_INTERVAL = 0.02
+
+    def __init__(self, directory=None, wait=60, keep=10):
+        self.directory = directory or os.path.join(CACHE_DIR, "single-flight")
+        self.wait = wait
+        self.keep = keep
+        self._swept = time.time()
+
+    def do(self, key, func):
+        private_dir(self.directory)
+        path = os.path.join(self.directory, hashlib.sha256(repr(key).encode()).hexdigest())
+        started = time.time()
+        with open(path + ".lock", "a") as lock:
+            waited = False
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.time() - started > self.wait:
+                        return func()
+                    waited = True
+                    time.sleep(self.POLL_INTERVAL)
+            try:
+                if waited:
+                    found = self._read(path + ".result", started)
+                    if found is not None:
+                        if "error" in found:
+                            raise SharedCallError(found["error"])
+                        return found["value"]
+                try:
+                    value = func()
+                except Exception as e:
+                    self._write(path + ".result", {"error": f"{type(e).__name__}: {e}"})
+                    raise
+                self._write(path + ".result", {"value": value})
+                return value
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self, path, since):
+        try:
+            with open(path) as f:
+                found = loads(f.read())
+        except (OSError, ValueError):
+            return None
+        return found if found.get("written", 0) >= since else None
+
+    def _write(self, path, payload):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(dumps({"written": time.time(), **payload}))
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError):
+            logger.warning("Could not share the result of a call across workers.", exc_info=True)
+            return
+        if time.time() - self._swept > self.keep:
+            self._swept = time.time()
+            self._sweep()
+
+    def _sweep(self):
+        cutoff = time.time() - self.keep
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+def json_size(value):
+    return len(dumps(value, default=str))
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,87 @@
+"""Gunicorn settings for the agent UI.
+
+Run with ``gunicorn -c gunicorn.conf.py app:app``. Every setting can be
+overridden from the environment so the same image serves both modes:
+
+* ``GUNICORN_WORKER_CLASS=gevent`` (default) runs cooperative workers. A
+  ``/chat`` stream parks a greenlet on the upstream socket instead of holding
+  the whole worker, so page loads keep being served while answers stream.
+* ``GUNICORN_WORKER_CLASS=sync`` is the old behaviour: one request per worker,
+  so each open chat stream blocks a worker until the LLM finishes.
+
+Concurrency ceiling (gevent): each open stream costs one greenlet and two
+sockets (browser and upstream). A worker accepts at most
+``GUNICORN_WORKER_CONNECTIONS`` concurrent connections (default 1000); past
+that, new connections wait in the listen backlog. The file descriptor limit
+must allow roughly twice that per worker (``ulimit -n``). Upstream
+connections above ``OPB_POOL_MAXSIZE`` are opened as needed and closed
+instead of being returned to the pool. ``benchmarks/bench_chat_streams.py``
+measures how many streams a single worker holds.
+
+With gevent workers ``timeout`` only bounds a worker that stops
+heartbeating. It does not cut off long streams the way it does for sync
+workers.
+
+With ``OPB_CACHE_BACKEND=sqlite`` the workers share their caches through
+SQLite databases under ``OPB_CACHE_DIR``. Those of caches that don't
+persist (see ``OPB_CACHE_PERSIST``) are removed when Gunicorn starts.
+
+Startup: with ``GUNICORN_PRELOAD`` (default on) the master imports the app
+and compiles every template once before forking. Workers then start
+without importing anything and share those pages copy-on-write.
+Compiled templates are also kept in a Jinja bytecode cache under
+``OPB_CACHE_DIR``, so a restart loads them instead of compiling again. Set
+``GUNICORN_PRELOAD=false`` to get code changes with a ``HUP`` reload instead
+of a restart. Background threads (health prober, stream readers) and
+upstream connections are started per worker after the fork.
+``benchmarks/bench_startup.py`` measures the time to the first request
+served.
+
+Workers write Prometheus samples to ``PROMETHEUS_MULTIPROC_DIR`` (a fresh
+temporary directory unless set) so /metrics reports all of them.
+"""
+import glob
+import os
+import shutil
+import tempfile
+
+# Unset, gunicorn's own defaults apply: 0.0.0.0:$PORT when PORT is set, and WEB_CONCURRENCY workers
+if "GUNICORN_BIND" in os.environ:
+    bind = os.environ["GUNICORN_BIND"]
+if "GUNICORN_WORKERS" in os.environ:
+    workers = int(os.environ["GUNICORN_WORKERS"])
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+if worker_class == "gevent":
+    # With preload_app the master imports the app, so ssl, socket and
+    # threading must be patched before that, not in each worker after fork
+    from gevent import monkey
+
+    monkey.patch_all()
+
+# Must be set before the app is imported
+os.environ.setdefault("OPB_PRECOMPILE_TEMPLATES", "true")
+
+# Must be set before any worker imports prometheus_client
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="opb-ui-metrics-"))
+
+
+def on_starting(server):
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(metrics_dir, exist_ok=True)
+    # Samples from a previous run would be added to this one's
+    for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+        os.remove(path)
+    # Shared caches that don't persist start empty
+    from cache import VOLATILE_DIR
+
+    shutil.rmtree(VOLATILE_DIR, ignore_errors=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
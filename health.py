@@ -0,0 +1,206 @@
+"""Upstream health: one prober per host and a circuit breaker per worker.
+
+Every worker runs a prober thread, but only the one holding an flock on
+``health.lock`` under OPB_CACHE_DIR probes the OPB API. It writes the
+result to ``health.json``, which the other workers read, so /status is
+answered from memory instead of pinging upstream for every client. When
+the probing worker exits, its lock is released and another worker takes
+over.
+
+The circuit breaker counts consecutive failed calls (connection errors,
+timeouts and 502/503/504 answers). An application error such as a 500 for
+one bad resource means the API is up, so it does not count. After OPB_BREAKER_FAILURES of them, or when the
+prober reports the API down, it opens. Calls then fail at once with
+UpstreamUnavailable instead of each waiting out its timeout. After
+OPB_BREAKER_RESET seconds, or as soon as the prober sees the API up again,
+it goes half-open and lets a single call through. Success closes it and
+failure opens it again.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from cache import CACHE_DIR, private_dir
+
+INTERVAL = float(os.environ.get("OPB_HEALTH_INTERVAL", 10))
+FAILURES = int(os.environ.get("OPB_BREAKER_FAILURES", 5))
+RESET = float(os.environ.get("OPB_BREAKER_RESET", 30))
+
+# Answers that mean the API itself, not one request, is failing
+UNAVAILABLE_STATUSES = frozenset({502, 503, 504})
+
+# The app logger, configured in app_helper
+logger = logging.getLogger("logger")
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """Raised instead of calling the OPB API while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failures=FAILURES, reset=RESET):
+        self.threshold = failures
+        self.reset = reset
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go upstream now. Every allowed call must be followed by ``record``."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset:
+                    return False
+                self._half_open()
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, ok):
+        """Record a call's outcome: True, False, or None when it says nothing about upstream."""
+        with self._lock:
+            if ok is None:
+                self._trial = False
+            elif ok:
+                if self.state != self.CLOSED:
+                    logger.info("OPB API is answering again, closing the circuit breaker.")
+                self.state = self.CLOSED
+                self.failures = 0
+                self._trial = False
+            else:
+                self.failures += 1
+                if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                    self._open()
+
+    def trip(self):
+        """Open the breaker because the API is known to be down."""
+        with self._lock:
+            if self.state != self.OPEN:
+                self._open()
+
+    def probe_succeeded(self):
+        """Let a call through to check recovery because the API is known to be up."""
+        with self._lock:
+            if self.state == self.OPEN:
+                self._half_open()
+
+    def _open(self):
+        if self.state != self.OPEN:
+            logger.warning("OPB API is failing, opening the circuit breaker for %ss.", self.reset)
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._trial = False
+
+    def _half_open(self):
+        self.state = self.HALF_OPEN
+        self._trial = False
+
+
+class HealthProber:
+    """Probes the OPB API in the background from one worker and shares the result."""
+
+    def __init__(self, probe, breaker, interval=INTERVAL, directory=CACHE_DIR):
+        self.probe = probe
+        self.breaker = breaker
+        self.interval = interval
+        self.state_path = os.path.join(directory, "health.json")
+        self.lock_path = os.path.join(directory, "health.lock")
+        self._health = {"status": "unknown"}
+        self._mtime = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start this process's prober thread, also after a fork."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, daemon=True).start()
+
+    def status(self):
+        """The last probe result. It is ``unknown`` when no worker has probed for a while."""
+        self.ensure_started()
+        health = self._refresh()
+        if health.get("checked", 0) < time.time() - 3 * self.interval:
+            return {**health, "status": "unknown"}
+        return health
+
+    def _run(self):
+        try:
+            private_dir(os.path.dirname(self.state_path))
+        except OSError:
+            logger.exception("Health probes are off: no private directory for their state.")
+            return
+        # Held for the life of the process once acquired
+        lock = open(self.lock_path, "a")
+        leader = False
+        while True:
+            if not leader:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    leader = True
+                    logger.info("Worker %d is probing the OPB API's health.", os.getpid())
+                except BlockingIOError:
+                    pass
+            try:
+                if leader:
+                    self._write(self._probe_once())
+                self._refresh()
+            except Exception:
+                logger.exception("Health probe failed.")
+            time.sleep(self.interval)
+
+    def _probe_once(self):
+        start = time.monotonic()
+        error = None
+        try:
+            ok = self.probe()
+        except Exception as e:
+            ok, error = False, type(e).__name__
+        return {
+            "status": "ok" if ok else "down",
+            "checked": time.time(),
+            "latency": round(time.monotonic() - start, 3),
+            "error": error,
+        }
+
+    def _write(self, health):
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(health, f)
+        os.replace(tmp, self.state_path)
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.state_path).st_mtime_ns
+        except OSError:
+            return self._health
+        if mtime != self._mtime:
+            try:
+                with open(self.state_path) as f:
+                    health = json.load(f)
+            except (OSError, ValueError):
+                return self._health
+            self._health, self._mtime = health, mtime
+            if health["status"] == "down":
+                self.breaker.trip()
+            else:
+                self.breaker.probe_succeeded()
+        return self._health
+
+
+breaker = CircuitBreaker()
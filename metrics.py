@@ -0,0 +1,228 @@
+"""Prometheus metrics and per-request tracing for the UI.
+
+Metrics are served on /metrics. With OPB_METRICS_TOKEN set a scrape must
+send ``Authorization: Bearer <token>``. Without it /metrics only answers
+loopback and private addresses, so behind a reverse proxy (where every
+request comes from the proxy) set the token or block /metrics at the proxy.
+
+Under gunicorn, gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a
+shared directory. Each worker then writes its samples there and /metrics
+aggregates all workers, whichever one answers the scrape.
+
+Cache hit ratios come from ``ui_cache_lookups_total``, e.g.
+``sum by (cache) (rate(ui_cache_lookups_total{result="hit"}[5m]))
+/ sum by (cache) (rate(ui_cache_lookups_total[5m]))``.
+
+Chat streams record their outcome (completed, error, cancelled or
+disconnected). Generation paid for but never shown is
+``sum(rate(ui_chat_stream_bytes_total{direction="received"}[1h]))
+- sum(rate(ui_chat_stream_bytes_total{direction="delivered"}[1h]))``.
+
+Every request also gets a trace id (the incoming ``X-Request-ID`` if it
+looks sane, otherwise a new one). api_request forwards it upstream, log
+lines include it and the response echoes it, together with a
+``Server-Timing`` header that breaks the request into phases: each
+upstream endpoint, any ``timed()`` block and template rendering. Calls
+made concurrently by fan_out are summed, so an upstream phase can be
+longer than the request.
+"""
+import hmac
+import ipaddress
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import before_render_template, g, has_app_context, request, template_rendered
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+UPSTREAM_LATENCY = Histogram(
+    "opb_upstream_request_seconds",
+    "Time until the OPB API returned response headers, by endpoint.",
+    ["endpoint", "method"],
+    buckets=BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "opb_upstream_errors_total",
+    "OPB API calls that raised or returned an error status, by endpoint.",
+    ["endpoint", "kind"],
+)
+UPSTREAM_COALESCED = Counter(
+    "opb_upstream_coalesced_total",
+    "OPB API calls answered by an identical call already in flight, by endpoint and scope (worker or shared).",
+    ["endpoint", "scope"],
+)
+REQUEST_LATENCY = Histogram(
+    "ui_request_seconds",
+    "Time spent handling a request by route, split into upstream, processing, render and total.",
+    ["route", "phase"],
+    buckets=BUCKETS,
+)
+ACTIVE_STREAMS = Gauge(
+    "ui_active_sse_streams",
+    "Chat SSE streams currently open.",
+    multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "ui_cache_lookups_total",
+    "Cache lookups by cache and result (hit or miss).",
+    ["cache", "result"],
+)
+STREAM_DURATION = Histogram(
+    "ui_chat_stream_seconds",
+    "Lifetime of chat streams from the upstream call until they were done with, by outcome.",
+    ["outcome"],
+    buckets=BUCKETS,
+)
+STREAM_BYTES = Counter(
+    "ui_chat_stream_bytes_total",
+    "Chat stream bytes received from the OPB API and delivered to browsers, by outcome.",
+    ["outcome", "direction"],
+)
+
+
+TRACE_HEADER = os.environ.get("OPB_TRACE_HEADER", "X-Request-ID")
+_trace_id_pattern = re.compile(r"^[A-Za-z0-9._-]{8,64}$")
+# Phases can be recorded from fan_out threads sharing the request's g
+_phases_lock = threading.Lock()
+
+
+def current_trace_id():
+    if has_app_context():
+        return g.get("trace_id")
+    return None
+
+
+def record_phase(name, elapsed):
+    """Add ``elapsed`` seconds to phase ``name`` of the current request, if there is one."""
+    if has_app_context() and "phases" in g:
+        with _phases_lock:
+            total, count = g.phases.get(name, (0.0, 0))
+            g.phases[name] = (total + elapsed, count + 1)
+
+
+@contextmanager
+def timed(name):
+    """Record the time spent in the block as phase ``name`` of the current request."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record_phase(name, time.monotonic() - start)
+
+
+def observe_upstream(endpoint, method, elapsed, status=None, error=None):
+    """Record one OPB API call, and add its time to the current request's phases."""
+    UPSTREAM_LATENCY.labels(endpoint, method).observe(elapsed)
+    if error is not None:
+        UPSTREAM_ERRORS.labels(endpoint, type(error).__name__).inc()
+    elif status is not None and status >= 400:
+        UPSTREAM_ERRORS.labels(endpoint, str(status)).inc()
+    record_phase(f"upstream-{endpoint}", elapsed)
+
+
+def observe_circuit_open(endpoint):
+    UPSTREAM_ERRORS.labels(endpoint, "circuit_open").inc()
+
+
+def observe_coalesced(endpoint, scope):
+    UPSTREAM_COALESCED.labels(endpoint, scope).inc()
+
+
+def observe_cache(cache, hit):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def observe_stream(outcome, elapsed, received, delivered):
+    STREAM_DURATION.labels(outcome).observe(elapsed)
+    STREAM_BYTES.labels(outcome, "received").inc(received)
+    STREAM_BYTES.labels(outcome, "delivered").inc(delivered)
+
+
+def _before_request():
+    incoming = request.headers.get(TRACE_HEADER, "")
+    g.trace_id = incoming if _trace_id_pattern.match(incoming) else uuid.uuid4().hex
+    g.request_start = time.monotonic()
+    g.phases = {}
+
+
+def _before_render(sender, template, context, **extra):
+    g.render_start = time.monotonic()
+
+
+def _rendered(sender, template, context, **extra):
+    if "render_start" in g:
+        record_phase("render", time.monotonic() - g.pop("render_start"))
+
+
+def server_timing(phases, total):
+    entries = []
+    for name, (elapsed, count) in phases.items():
+        entry = f"{name};dur={elapsed * 1000:.1f}"
+        if count > 1:
+            entry += f';desc="{count} calls"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def _after_request(response):
+    if "request_start" not in g:
+        return response
+    total = time.monotonic() - g.request_start
+    upstream = sum(elapsed for name, (elapsed, _) in g.phases.items() if name.startswith("upstream-"))
+    render = g.phases.get("render", (0.0, 0))[0]
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_LATENCY.labels(route, "upstream").observe(upstream)
+    REQUEST_LATENCY.labels(route, "render").observe(render)
+    REQUEST_LATENCY.labels(route, "processing").observe(max(0.0, total - upstream - render))
+    REQUEST_LATENCY.labels(route, "total").observe(total)
+    response.headers["Server-Timing"] = server_timing(g.phases, total)
+    response.headers[TRACE_HEADER] = g.trace_id
+    return response
+
+
+METRICS_TOKEN = os.environ.get("OPB_METRICS_TOKEN")
+
+
+def _scrape_allowed():
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+    try:
+        address = ipaddress.ip_address(request.remote_addr or "")
+    except ValueError:
+        return False
+    return address.is_loopback or address.is_private
+
+
+def metrics_view():
+    if not _scrape_allowed():
+        return "Forbidden\n", 403, {"Content-Type": "text/plain"}
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -0,0 +1,331 @@
+"""Relay of the OPB API's chat stream to the browser as server-sent events.
+
+Upstream lines are passed through as bytes, without decoding and
+re-encoding. A reader thread (a greenlet under gevent workers) appends
+them to the stream's buffer as events with ids of the form
+``<token>:<seq>``. Browser connections read from the buffer. While
+upstream is silent, for example during a long tool call, a comment line
+is sent every heartbeat interval so proxies keep the connection open.
+
+Writes are at least the coalescing window apart. An event that arrives
+after a quiet spell goes out at once. Events that arrive sooner are
+gathered until the window has passed since the last write, so bursts are
+sent in a few larger writes and slow streams are never delayed.
+
+The buffer is a ring bounded by event count and bytes. Only events that
+have been written to a browser are evicted. When the buffer is full of
+unsent events the reader stops pulling from upstream, so backpressure
+from a slow or dropped browser reaches the OPB API instead of piling up
+in memory. A browser that reconnects with ``Last-Event-ID`` gets the
+missed events replayed from the buffer and carries on with the running
+stream. It does not start a new generation. Streams live in memory, so a
+reconnect must reach the same worker to resume.
+
+When the browser goes away, the server notices at the next write (a
+heartbeat at the latest). If no connection reattaches within the
+disconnect grace period, the upstream response is closed so the OPB API
+stops generating. ``StreamRegistry.cancel`` does the same at once, for the
+chat page's explicit cancel. Each stream's lifetime and bytes are
+recorded by outcome: completed, error, cancelled or disconnected.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+from metrics import observe_stream
+
+COALESCE_WINDOW = float(os.environ.get("OPB_SSE_COALESCE_MS", 10)) / 1000
+MAX_BATCH_BYTES = int(os.environ.get("OPB_SSE_MAX_BATCH_BYTES", 16 * 1024))
+HEARTBEAT_INTERVAL = float(os.environ.get("OPB_SSE_HEARTBEAT", 15))
+BUFFER_EVENTS = int(os.environ.get("OPB_SSE_BUFFER_EVENTS", 4096))
+BUFFER_BYTES = int(os.environ.get("OPB_SSE_BUFFER_BYTES", 1024 * 1024))
+# How long a finished or abandoned stream is kept for replay
+RESUME_WINDOW = float(os.environ.get("OPB_SSE_RESUME_WINDOW", 30))
+# How long a running stream without a browser waits for a reconnect before upstream is closed
+DISCONNECT_GRACE = float(os.environ.get("OPB_SSE_DISCONNECT_GRACE", 5))
+RETRY_MS = int(os.environ.get("OPB_SSE_RETRY_MS", 1000))
+
+HEARTBEAT = b": keep-alive\n\n"
+RETRY = b"retry: %d\n\n" % RETRY_MS
+HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def event(data, event_id=None):
+    """Format one SSE ``data`` event from bytes."""
+    if event_id is None:
+        return b"data: " + data + b"\n\n"
+    return b"id: " + event_id.encode() + b"\ndata: " + data + b"\n\n"
+
+
+class Stream:
+    """One upstream stream and a replay buffer of its events."""
+
+    def __init__(
+        self,
+        lines,
+        close=None,
+        session_id=None,
+        uid=None,
+        max_events=BUFFER_EVENTS,
+        max_bytes=BUFFER_BYTES,
+        resume_window=RESUME_WINDOW,
+        disconnect_grace=DISCONNECT_GRACE,
+    ):
+        self.token = secrets.token_urlsafe(9)
+        self.session_id = session_id
+        self.uid = uid
+        self.seq = 0
+        self.delivered = 0
+        self.error = None
+        self.finished = None
+        self.closed = False
+        self.outcome = None
+        self.consumers = 0
+        self.started = self.idle_since = time.monotonic()
+        self._lines = lines
+        self._close = close
+        self._events = deque()
+        self._bytes = 0
+        self._written = 0
+        self._delivered_bytes = 0
+        self._max_events = max_events
+        self._max_bytes = max_bytes
+        self._resume_window = resume_window
+        self._disconnect_grace = disconnect_grace
+        self._cond = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._read, daemon=True).start()
+        return self
+
+    def close(self, outcome="cancelled"):
+        """Stop reading and close the upstream response.
+
+        Events already buffered can still be read.
+        """
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            retired = self.outcome is None
+            if retired:
+                self.outcome = outcome
+            self._cond.notify_all()
+        self._release()
+        if retired:
+            self._observe()
+
+    def _release(self):
+        with self._cond:
+            close, self._close = self._close, None
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def _retire(self, outcome):
+        with self._cond:
+            if self.outcome is not None:
+                return
+            self.outcome = outcome
+        self._observe()
+
+    def _observe(self):
+        observe_stream(self.outcome, time.monotonic() - self.started, self._written, self._delivered_bytes)
+
+    def _reap(self, idle_since):
+        with self._cond:
+            if self.consumers or self.outcome is not None or self.idle_since != idle_since:
+                return
+        self.close("disconnected")
+
+    def expired(self, now=None):
+        """True once nobody has read the stream for the resume window."""
+        now = time.monotonic() if now is None else now
+        return not self.consumers and now - self.idle_since > self._resume_window
+
+    def _read(self):
+        try:
+            for line in self._lines:
+                if line and not self._append(line):
+                    break
+        except Exception as e:
+            if not self.closed:
+                self.error = e
+        finally:
+            with self._cond:
+                self.finished = time.monotonic()
+                self._cond.notify_all()
+            self._release()
+
+    def _append(self, data):
+        with self._cond:
+            chunk = event(data, f"{self.token}:{self.seq + 1}")
+            while self._events and (
+                len(self._events) >= self._max_events or self._bytes + len(chunk) > self._max_bytes
+            ):
+                if self._events[0][0] <= self.delivered:
+                    self._bytes -= len(self._events.popleft()[1])
+                    continue
+                if self.closed:
+                    return False
+                if self.expired():
+                    self.close("disconnected")
+                    return False
+                self._cond.wait(1)
+            if self.closed:
+                return False
+            self.seq += 1
+            self._written += len(chunk)
+            self._events.append((self.seq, chunk, self._written))
+            self._bytes += len(chunk)
+            self._cond.notify_all()
+            return True
+
+    def _take(self, next_seq, max_bytes):
+        if not self._events or self._events[-1][0] < next_seq:
+            return []
+        first = self._events[0][0]
+        if first > next_seq:
+            raise LookupError(f"events {next_seq}..{first - 1} of stream {self.token} were evicted")
+        batch, size = [], 0
+        for _, chunk, end in islice(self._events, next_seq - first, None):
+            if batch and size + len(chunk) > max_bytes:
+                break
+            batch.append(chunk)
+            size += len(chunk)
+            self._delivered_bytes = max(self._delivered_bytes, end)
+        return batch
+
+    def iter_events(
+        self,
+        after=0,
+        coalesce_window=COALESCE_WINDOW,
+        heartbeat_interval=HEARTBEAT_INTERVAL,
+        max_batch_bytes=MAX_BATCH_BYTES,
+    ):
+        """Yield SSE chunks for the events after sequence number ``after``.
+
+        An exception raised by upstream is re-raised once every event
+        before it has been yielded. LookupError means the events after
+        ``after`` have already been evicted from the buffer.
+        """
+        next_seq = after + 1
+        last_write = 0.0
+        with self._cond:
+            self.consumers += 1
+        try:
+            while True:
+                with self._cond:
+                    if not self._cond.wait_for(
+                        lambda: self.seq >= next_seq or self.finished is not None or self.closed,
+                        heartbeat_interval,
+                    ):
+                        chunks = [HEARTBEAT]
+                    else:
+                        deadline = last_write + coalesce_window
+                        while self.finished is None and not self.closed:
+                            remaining = deadline - time.monotonic()
+                            pending = self._bytes_after(next_seq)
+                            if remaining <= 0 or pending >= max_batch_bytes or not self._cond.wait(remaining):
+                                break
+                        chunks = self._take(next_seq, max_batch_bytes)
+                        if chunks:
+                            next_seq += len(chunks)
+                            self.delivered = max(self.delivered, next_seq - 1)
+                            self._cond.notify_all()
+                        elif self.error is not None:
+                            self._retire("error")
+                            raise self.error
+                        else:
+                            self._retire("completed")
+                            return
+                yield b"".join(chunks)
+                last_write = time.monotonic()
+        finally:
+            with self._cond:
+                self.consumers -= 1
+                self.idle_since = idle_since = time.monotonic()
+                abandoned = not self.consumers and self.outcome is None
+                self._cond.notify_all()
+            if abandoned:
+                timer = threading.Timer(self._disconnect_grace, self._reap, (idle_since,))
+                timer.daemon = True
+                timer.start()
+
+    def _bytes_after(self, next_seq):
+        if not self._events or self._events[-1][0] < next_seq:
+            return 0
+        _, chunk, end = self._events[max(0, next_seq - self._events[0][0])]
+        return self._written - end + len(chunk)
+
+
+def relay(lines, **kwargs):
+    """Yield SSE chunks for an iterable of upstream lines (bytes).
+
+    Keyword arguments go to ``Stream.iter_events``. Closing this generator
+    stops the reader.
+    """
+    stream = Stream(lines).start()
+    try:
+        yield from stream.iter_events(**kwargs)
+    finally:
+        stream.close()
+
+
+class StreamRegistry:
+    """Running and recently finished streams of this worker, by token."""
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def open(self, lines, close=None, session_id=None, uid=None):
+        """Start a stream over upstream ``lines`` and register it."""
+        stream = Stream(lines, close=close, session_id=session_id, uid=uid)
+        with self._lock:
+            self._sweep()
+            self._streams[stream.token] = stream
+        return stream.start()
+
+    def resume(self, last_event_id, session_id, uid):
+        """Return ``(stream, seq)`` for a ``Last-Event-ID`` from this session.
+
+        Raises LookupError when the stream is unknown to this worker, has
+        expired, or belongs to another session or user.
+        """
+        token, _, seq = last_event_id.rpartition(":")
+        with self._lock:
+            self._sweep()
+            stream = self._streams.get(token)
+        if stream is None or stream.session_id != session_id or stream.uid != uid or not seq.isdigit():
+            raise LookupError(f"no stream to resume for event {last_event_id!r}")
+        return stream, int(seq)
+
+    def cancel(self, session_id, uid):
+        """Close the unfinished streams of a session and return how many there were."""
+        with self._lock:
+            matches = [
+                stream for stream in self._streams.values()
+                if stream.session_id == session_id and stream.uid == uid and stream.outcome is None
+            ]
+        for stream in matches:
+            stream.close("cancelled")
+        return len(matches)
+
+    def _sweep(self):
+        now = time.monotonic()
+        for token, stream in list(self._streams.items()):
+            if stream.expired(now):
+                stream.close("disconnected")
+                del self._streams[token]
+
+    def __len__(self):
+        return len(self._streams)
+
+
+streams = StreamRegistry()
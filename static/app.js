@@ -494,8 +494,80 @@ function clearLoaderMessage() {
     }
 }
 
+// Upload files with XHR for its progress events. The server passes them on to the API as they arrive,
+// so the bytes sent are the bytes received upstream.
+function uploadFiles(sessionId, files) {
+    return new Promise((resolve, reject) => {
+        const formData = new FormData();
+        formData.append('sessionId', sessionId);
+        files.forEach((file) => formData.append('files', file));
+
+        const xhr = new XMLHttpRequest();
+        xhr.open('POST', `/chat?${new URLSearchParams({sessionId: sessionId})}`);
+        xhr.responseType = 'json';
+        xhr.upload.onprogress = function(event) {
+            // Files are sent in order, so split the bytes sent across them
+            let offset = 0;
+            files.forEach((file) => {
+                const sent = Math.min(Math.max(event.loaded - offset, 0), file.size);
+                offset += file.size;
+                const fileProgress = document.getElementById(`${file.name}-progress`);
+                if (fileProgress && file.size > 0) {
+                    fileProgress.textContent = ` ${Math.floor(100 * sent / file.size)}%`;
+                }
+            });
+        };
+        xhr.onload = function() {
+            if (xhr.status >= 200 && xhr.status < 300 && xhr.response) {
+                resolve(xhr.response);
+            } else if (xhr.status === 413) {
+                reject(new Error('Files are too large to upload'));
+            } else {
+                reject(new Error('Failed to upload files'));
+            }
+        };
+        xhr.onerror = () => reject(new Error('Failed to upload files'));
+        xhr.send(formData);
+    });
+}
+
+// Ask which files this session has already uploaded, by SHA-256, so they aren't sent again
+async function checkUploadedFiles(sessionId, files) {
+    // crypto.subtle is only available on secure origins
+    if (!window.crypto || !window.crypto.subtle) return [];
+    try {
+        const checks = await Promise.all(files.map(async (file) => {
+            const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+            const sha256 = Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+            return {"name": file.name, "sha256": sha256, "size": file.size};
+        }));
+        const response = await fetch('/chat/upload_check', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({"sessionId": sessionId, "files": checks})
+        });
+        if (!response.ok) return [];
+        return (await response.json()).results;
+    } catch (error) {
+        console.warn('Upload check failed, uploading all files:', error);
+        return [];
+    }
+}
+
 let eventSource;
+let eventSourceSessionId = null;
 let currentSessionId = null;
+const MAX_STREAM_RECONNECTS = 5;
+
+// Tell the server to stop generating an answer nobody will read
+function cancelStream() {
+    if (!eventSource || eventSource.readyState === EventSource.CLOSED) return;
+    eventSource.close();
+    const formData = new FormData();
+    formData.append('sessionId', eventSourceSessionId);
+    navigator.sendBeacon('/chat/cancel', formData);
+}
+window.addEventListener('pagehide', cancelStream);
 async function sendMessage() {
     // Extract the bot parameter from the URL
     const pathParts = window.location.pathname.split('/');
@@ -525,9 +597,7 @@ async function sendMessage() {
     uploadedFiles = [];
     updateFileList();
 
-    if (eventSource) {
-        eventSource.close();
-    }
+    cancelStream();
 
     try {
         if (!currentSessionId) {
@@ -541,22 +611,17 @@ async function sendMessage() {
             saveSessions(sessions);
             addSessionToSidebar(newSession);
         }
-        // Only use FormData if we have files
+        // Only upload if we have files
         if (userFiles.length > 0) {
-            const formData = new FormData();
-            formData.append('sessionId', currentSessionId);
-            userFiles.forEach((file) => {
-                formData.append('files', file);
-                handleStreamEvent({"type": "file", "id": file.name})
-            });
-
-            const response = await fetch('/chat', {
-                method: 'POST',
-                body: formData
-            });
-            if (!response.ok) throw new Error('Failed to upload files');
-            const uploadResult = await response.json();
-            uploadResult.results.forEach((result) => {
+            userFiles.forEach((file) => handleStreamEvent({"type": "file", "id": file.name}));
+            let results = await checkUploadedFiles(currentSessionId, userFiles);
+            const uploaded = new Set(results.map((result) => result.id));
+            const newFiles = userFiles.filter((file) => !uploaded.has(file.name));
+            if (newFiles.length > 0) {
+                const uploadResult = await uploadFiles(currentSessionId, newFiles);
+                results = results.concat(uploadResult.results);
+            }
+            results.forEach((result) => {
                 let streamEvent = {
                     "type": "file_upload_result",
                     "id": result.id,
@@ -579,11 +644,19 @@ async function sendMessage() {
             message: userMessage
         });
         eventSource = new EventSource(`/chat?${params}`);
+        eventSourceSessionId = currentSessionId;
+        let reconnects = 0;
         eventSource.onmessage = function(event) {
+            reconnects = 0;
             const data = JSON.parse(event.data);
             handleStreamEvent(data);
         };
         eventSource.onerror = function(error) {
+            // The browser reconnects with Last-Event-ID and the server replays what was missed
+            if (eventSource.readyState === EventSource.CONNECTING && reconnects++ < MAX_STREAM_RECONNECTS) {
+                console.warn('EventSource dropped, reconnecting:', error);
+                return;
+            }
             console.error('EventSource failed:', error);
             eventSource.close();
             clearLoaderMessage();
@@ -617,7 +690,7 @@ function handleStreamEvent(data) {
             // Add file upload message
             addMessageToChat(
                 'tool',
-                `<p class="mb-0" id="${data.id}-msg"><i>Uploading ${data.id}<span id="${data.id}-dots" class="dots"></span></i></p>`
+                `<p class="mb-0" id="${data.id}-msg"><i>Uploading ${data.id}<span id="${data.id}-progress"></span><span id="${data.id}-dots" class="dots"></span></i></p>`
             );
             break;
         case 'file_upload_result':
@@ -627,6 +700,10 @@ function handleStreamEvent(data) {
                 break;
             }
             fileDots.classList.remove('dots');
+            let fileProgress = document.getElementById(`${data.id}-progress`);
+            if (fileProgress) {
+                fileProgress.remove();
+            }
             if (data.status === "Success") {
                 fileDots.innerHTML = '...finished.';
             } else {
@@ -1182,6 +1259,8 @@ async function getCurrentSessionTitle() {
     const response = await fetch(`/sessions?ids[]=${currentSessionId}`);
     if (!response.ok) throw new Error('Failed to get sessions from server');
     let fetchedSessions = await response.json();
+    // Sessions the server couldn't fetch come back with an error marker
+    if (fetchedSessions[0].error) return;
     let savedSessions = loadSavedSessions();
     // if savedSessions contains a session with id === fetchedSessions[0].id,
     // then replace it with the fetched session
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Set before the app modules are imported, since they read these at import time
+os.environ.setdefault("OPB_CACHE_DIR", tempfile.mkdtemp(prefix="opb-test-cache-"))
+os.environ.setdefault("OPB_API_URL", "http://127.0.0.1:9")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
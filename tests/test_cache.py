@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from cache import SQLiteCache, TTLCache, new_cache
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path, request):
+    def make(ttl=60, **kwargs):
+        return SQLiteCache(f"test_{request.node.name}", ttl, path=str(tmp_path / "cache.sqlite3"), **kwargs)
+    return make
+
+
+def fill(cache, keys, value="x"):
+    for key in keys:
+        cache.set(key, value)
+        # Entries are ordered by expiry, so give each its own
+        time.sleep(0.002)
+
+
+def test_values_round_trip_as_json(sqlite_cache):
+    cache = sqlite_cache()
+    cache.set(("user", "bots"), {"b1": {"name": "bot", "tools": [1, 2]}})
+    assert cache.get(("user", "bots")) == {"b1": {"name": "bot", "tools": [1, 2]}}
+    assert cache.get(("user", "other")) is None
+    assert cache.get_many([("user", "bots"), "missing"]) == {("user", "bots"): {"b1": {"name": "bot", "tools": [1, 2]}}}
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_workers_share_entries(sqlite_cache):
+    writer, reader = sqlite_cache(), sqlite_cache()
+    writer.set("key", [1, 2, 3])
+    assert reader.get("key") == [1, 2, 3]
+    reader.invalidate("key")
+    assert writer.get("key") is None
+
+
+def test_max_entries_evicts_the_oldest_written(sqlite_cache):
+    cache = sqlite_cache(max_entries=3)
+    fill(cache, ["a", "b", "c", "d", "e"])
+    assert sorted(cache.get_many(["a", "b", "c", "d", "e"])) == ["c", "d", "e"]
+    assert cache.stats()["size"] == 3
+
+
+def test_max_bytes_evicts_the_oldest_written(sqlite_cache):
+    cache = sqlite_cache(max_bytes=30)
+    fill(cache, ["a", "b", "c", "d"], value="x" * 8)
+    # Each value is 10 bytes of JSON
+    assert sorted(cache.get_many(["a", "b", "c", "d"])) == ["b", "c", "d"]
+    cache.set("big", "x" * 40)
+    assert cache.get("big") is None
+    assert cache.stats()["bytes"] <= 30
+
+
+def test_expired_entries_are_missed_and_purged(sqlite_cache):
+    cache = sqlite_cache(ttl=0.05)
+    cache.PURGE_EVERY = 1
+    cache.set("old", 1)
+    time.sleep(0.06)
+    assert cache.get("old") is None
+    assert cache.get_stale("old") == 1
+    cache.set("new", 2)
+    assert cache.get_stale("old") is None
+    assert cache.get("new") == 2
+
+
+def test_keep_stale_keeps_expired_entries(sqlite_cache):
+    cache = sqlite_cache(ttl=0.05, keep_stale=True)
+    cache.PURGE_EVERY = 1
+    cache.set(("bot", "u"), {"etag": "1"})
+    time.sleep(0.06)
+    cache.set(("bot", "v"), {"etag": "2"})
+    assert cache.get(("bot", "u")) is None
+    assert cache.get_stale(("bot", "u")) == {"etag": "1"}
+
+
+def test_invalidate_where_sees_keys_as_lists(sqlite_cache):
+    cache = sqlite_cache()
+    cache.set_many({("b1", "u"): 1, ("b1", "v"): 2, ("b2", "u"): 3})
+    cache.invalidate_where(lambda key: key[0] == "b1")
+    assert cache.get_many([("b1", "u"), ("b1", "v"), ("b2", "u")]) == {("b2", "u"): 3}
+
+
+def test_memory_backend_evicts_least_recently_used():
+    cache = TTLCache("test_memory_lru", 60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get_many(["a", "c"]) == {"a": 1, "c": 3}
+
+
+def test_new_cache_picks_the_backend():
+    assert new_cache("test_pick_memory", 60, backend="memory").backend == "memory"
+    assert new_cache("test_pick_sqlite", 60, backend="sqlite").backend == "sqlite"
+    with pytest.raises(ValueError):
+        new_cache("test_pick_unknown", 60, backend="redis")
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from app_helper import fan_out, iter_fan_out
+
+
+def test_results_and_errors_by_item():
+    def func(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item * 2
+
+    results = fan_out(func, [1, 2, 3, 2], max_workers=2, deadline=5)
+    assert set(results) == {1, 2, 3}
+    assert results[1] == (2, None)
+    assert results[2] == (4, None)
+    assert results[3][0] is None
+    assert isinstance(results[3][1], ValueError)
+
+
+def test_at_most_max_workers_in_flight():
+    lock = threading.Lock()
+    running = peak = 0
+
+    def func(item):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+        return item
+
+    results = list(iter_fan_out(func, range(20), max_workers=3))
+    assert sorted(item for item, _, _ in results) == list(range(20))
+    assert peak <= 3
+
+
+def test_deadline_abandons_unfinished_items():
+    release = threading.Event()
+
+    def func(item):
+        if item == "slow":
+            release.wait(5)
+        return item
+
+    start = time.monotonic()
+    results = {item: (result, error) for item, result, error in iter_fan_out(func, ["fast", "slow"], 2, deadline=0.2)}
+    release.set()
+    assert time.monotonic() - start < 2
+    assert results["fast"] == ("fast", None)
+    assert results["slow"][0] is None
+    assert isinstance(results["slow"][1], TimeoutError)
+
+
+def test_timeout_is_per_item_and_frees_the_slot():
+    release = threading.Event()
+
+    def func(item):
+        if item == 0:
+            release.wait(5)
+        else:
+            time.sleep(0.05)
+        return item
+
+    start = time.monotonic()
+    results = {item: (result, error) for item, result, error in iter_fan_out(func, range(4), 1, timeout=0.2)}
+    release.set()
+    # The items queued behind the stuck one still run, each within its own timeout
+    assert time.monotonic() - start < 2
+    assert isinstance(results[0][1], TimeoutError)
+    assert [results[item] for item in (1, 2, 3)] == [(1, None), (2, None), (3, None)]
+
+
+def test_no_items():
+    assert list(iter_fan_out(lambda item: item, [], 4, deadline=1)) == []
@@ -0,0 +1,91 @@
+import os
+import time
+
+import health
+from health import CircuitBreaker
+
+
+def fail(breaker, times):
+    for _ in range(times):
+        assert breaker.allow()
+        breaker.record(False)
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=3, reset=60)
+    fail(breaker, 2)
+    assert breaker.state == breaker.CLOSED
+    fail(breaker, 1)
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failures=3, reset=60)
+    fail(breaker, 2)
+    assert breaker.allow()
+    breaker.record(True)
+    fail(breaker, 2)
+    assert breaker.state == breaker.CLOSED
+
+
+def test_calls_that_say_nothing_about_upstream_are_not_counted():
+    breaker = CircuitBreaker(failures=1, reset=60)
+    assert breaker.allow()
+    breaker.record(None)
+    assert breaker.state == breaker.CLOSED
+
+
+def test_half_open_lets_one_trial_call_through():
+    breaker = CircuitBreaker(failures=1, reset=0.05)
+    fail(breaker, 1)
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == breaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_trial_opens_again():
+    breaker = CircuitBreaker(failures=5, reset=0.05)
+    breaker.trip()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow()
+
+
+def test_trial_without_verdict_frees_the_trial():
+    breaker = CircuitBreaker(failures=1, reset=60)
+    breaker.trip()
+    breaker.probe_succeeded()
+    assert breaker.allow()
+    breaker.record(None)
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_probe_results_drive_the_breaker(tmp_path):
+    breaker = CircuitBreaker(failures=5, reset=60)
+    up = False
+    prober = health.HealthProber(lambda: up, breaker, directory=str(tmp_path))
+    prober._write(prober._probe_once())
+    assert prober._refresh()["status"] == "down"
+    assert breaker.state == breaker.OPEN
+    up = True
+    time.sleep(0.01)
+    prober._write(prober._probe_once())
+    assert prober._refresh()["status"] == "ok"
+    assert breaker.state == breaker.HALF_OPEN
+
+
+def test_stale_probe_result_is_unknown(tmp_path):
+    prober = health.HealthProber(lambda: True, CircuitBreaker(), interval=60, directory=str(tmp_path))
+    # As if this process's prober thread were running, so status() doesn't start one
+    prober._pid = os.getpid()
+    prober._write({"status": "ok", "checked": time.time() - 600})
+    assert prober.status()["status"] == "unknown"
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from cache import FileSingleFlight, SharedCallError, SingleFlight
+
+
+def concurrently(n, func):
+    """Run ``func()`` on n threads at once and return their results or exceptions."""
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = func()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def slow_call(value, calls):
+    def call():
+        calls.append(1)
+        time.sleep(0.2)
+        return value
+    return call
+
+
+def test_single_flight_shares_one_call():
+    flight, calls = SingleFlight(), []
+    assert concurrently(5, lambda: flight.do("key", slow_call({"n": 1}, calls))) == [{"n": 1}] * 5
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+
+
+def test_file_single_flight_shares_one_call(tmp_path):
+    # Each do() opens its own lock file description, so threads contend like processes
+    flight, calls = FileSingleFlight(directory=str(tmp_path / "sf")), []
+    assert concurrently(5, lambda: flight.do(("GET", "/x"), slow_call({"n": [1, 2]}, calls))) == [{"n": [1, 2]}] * 5
+    assert len(calls) == 1
+
+
+def test_file_single_flight_shares_errors(tmp_path):
+    flight, calls = FileSingleFlight(directory=str(tmp_path / "sf")), []
+
+    def fail():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError("upstream said no")
+
+    results = concurrently(3, lambda: flight.do("key", fail))
+    assert len(calls) == 1
+    assert sum(isinstance(result, ValueError) for result in results) == 1
+    shared = [result for result in results if isinstance(result, SharedCallError)]
+    assert len(shared) == 2
+    assert "ValueError: upstream said no" in str(shared[0])
+
+
+def test_file_single_flight_calls_again_once_finished(tmp_path):
+    flight, calls = FileSingleFlight(directory=str(tmp_path / "sf")), []
+    assert flight.do("key", slow_call(1, calls)) == 1
+    assert flight.do("key", slow_call(2, calls)) == 2
+    assert len(calls) == 2
+
+
+def test_file_single_flight_gives_up_waiting(tmp_path):
+    flight = FileSingleFlight(directory=str(tmp_path / "sf"), wait=0.05)
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        time.sleep(0.5)
+        return "leader"
+
+    leader = threading.Thread(target=flight.do, args=("key", hold))
+    leader.start()
+    started.wait(2)
+    assert flight.do("key", lambda: "waiter") == "waiter"
+    leader.join()
+
+
+def test_file_single_flight_directory_is_private(tmp_path):
+    directory = tmp_path / "sf"
+    FileSingleFlight(directory=str(directory)).do("key", lambda: 1)
+    assert directory.stat().st_mode & 0o777 == 0o700
+
+
+def test_unserializable_result_is_still_returned(tmp_path):
+    flight = FileSingleFlight(directory=str(tmp_path / "sf"))
+    value = object()
+    assert flight.do("key", lambda: value) is value
+
+
+def test_single_flight_error_reaches_every_caller():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.2)
+        raise KeyError("missing")
+
+    results = concurrently(3, lambda: flight.do("key", fail))
+    assert all(isinstance(result, KeyError) for result in results)
+    with pytest.raises(KeyError):
+        flight.do("key", fail)
@@ -0,0 +1,33 @@
+from app_helper import SourceGroups, organize_sources
+
+
+def chunk(source_id, pk, **extra):
+    return {"id": source_id, "entity": {"pk": pk, "text": f"{source_id}-{pk}"}, **extra}
+
+
+def test_groups_keep_first_seen_order():
+    groups = organize_sources([chunk("b", 1, title="B"), chunk("a", 1), chunk("b", 2)])
+    assert [group["source"]["id"] for group in groups] == ["b", "a"]
+    assert [group["original_index"] for group in groups] == [0, 1]
+    assert groups[0]["source"] == {"id": "b", "title": "B"}
+
+
+def test_duplicate_entities_are_dropped():
+    groups = organize_sources([chunk("a", 1), chunk("a", 2), chunk("a", 1)])
+    assert [entity["pk"] for entity in groups[0]["entities"]] == [1, 2]
+
+
+def test_entities_sorted_by_pk_after_out_of_order_adds():
+    sources = SourceGroups([chunk("a", 5), chunk("a", 2)])
+    sources.add(chunk("a", 9))
+    sources.add(chunk("a", 1))
+    assert [entity["pk"] for entity in sources.groups()[0]["entities"]] == [1, 2, 5, 9]
+    assert len(sources) == 1
+
+
+def test_input_is_not_modified():
+    new_sources = [chunk("a", 2), chunk("a", 1)]
+    before = [dict(source) for source in new_sources]
+    organize_sources(new_sources)
+    assert new_sources == before
+    assert all("entity" in source for source in new_sources)
@@ -0,0 +1,117 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import sse
+
+
+def upstream(lines):
+    """Upstream lines fed through a queue, ending at None, and a close that ends them."""
+    feed = queue.Queue()
+    for line in lines:
+        feed.put(line)
+
+    def iterate():
+        while (line := feed.get()) is not None:
+            yield line
+
+    return feed, iterate(), lambda: feed.put(None)
+
+
+def parse(chunks):
+    """The (id, data) of every event in SSE chunks."""
+    events = []
+    for block in b"".join(chunks).split(b"\n\n"):
+        fields = dict(line.split(b": ", 1) for line in block.split(b"\n") if line and not line.startswith(b":"))
+        if b"data" in fields:
+            events.append((fields.get(b"id", b"").decode(), fields[b"data"]))
+    return events
+
+
+def read(stream, after=0):
+    return parse(stream.iter_events(after, coalesce_window=0, heartbeat_interval=5))
+
+
+def test_events_are_numbered_and_passed_through():
+    stream = sse.Stream(iter([b'{"a": 1}', b"", b'{"b": 2}'])).start()
+    assert read(stream) == [(f"{stream.token}:1", b'{"a": 1}'), (f"{stream.token}:2", b'{"b": 2}')]
+    assert stream.outcome == "completed"
+
+
+def test_full_buffer_holds_back_upstream_until_events_are_sent():
+    lines = [b"%d" % i for i in range(20)]
+    stream = sse.Stream(iter(lines), max_events=3).start()
+    assert [data for _, data in read(stream)] == lines
+    # Only three events were kept, so the earliest can no longer be replayed
+    with pytest.raises(LookupError):
+        read(stream, after=0)
+
+
+def test_resume_replays_the_events_after_the_last_id():
+    feed, lines, close = upstream([b"1", b"2", b"3"])
+    stream = sse.Stream(lines, close=close).start()
+    first = stream.iter_events(coalesce_window=0, heartbeat_interval=5)
+    received = []
+    while len(received) < 3:
+        received += parse([next(first)])
+    first.close()
+    feed.put(b"4")
+    feed.put(None)
+    assert [data for _, data in read(stream, after=2)] == [b"3", b"4"]
+
+
+def test_upstream_error_is_raised_after_the_buffered_events():
+    def lines():
+        yield b"1"
+        raise OSError("upstream went away")
+
+    stream = sse.Stream(lines()).start()
+    events = stream.iter_events(coalesce_window=0, heartbeat_interval=5)
+    assert parse([next(events)]) == [(f"{stream.token}:1", b"1")]
+    with pytest.raises(OSError):
+        next(events)
+    assert stream.outcome == "error"
+
+
+def test_abandoned_stream_is_closed_after_the_grace_period():
+    closed = threading.Event()
+    feed, lines, close = upstream([b"1"])
+    stream = sse.Stream(lines, close=lambda: (close(), closed.set()), disconnect_grace=0.05).start()
+    events = stream.iter_events(coalesce_window=0, heartbeat_interval=5)
+    next(events)
+    events.close()
+    assert closed.wait(2)
+    assert stream.outcome == "disconnected"
+
+
+def test_reconnect_within_the_grace_period_keeps_the_stream():
+    feed, lines, close = upstream([b"1"])
+    stream = sse.Stream(lines, close=close, disconnect_grace=0.2).start()
+    events = stream.iter_events(coalesce_window=0, heartbeat_interval=5)
+    next(events)
+    events.close()
+    resumed = stream.iter_events(after=1, coalesce_window=0, heartbeat_interval=5)
+    feed.put(b"2")
+    assert parse([next(resumed)]) == [(f"{stream.token}:2", b"2")]
+    time.sleep(0.3)
+    assert stream.outcome is None
+    feed.put(None)
+    assert list(resumed) == []
+    assert stream.outcome == "completed"
+
+
+def test_registry_resumes_only_for_the_same_session_and_user():
+    registry = sse.StreamRegistry()
+    feed, lines, close = upstream([b"1"])
+    stream = registry.open(lines, close=close, session_id="s", uid="u")
+    last_event_id = f"{stream.token}:1"
+    assert registry.resume(last_event_id, "s", "u") == (stream, 1)
+    for session_id, uid in (("other", "u"), ("s", "other")):
+        with pytest.raises(LookupError):
+            registry.resume(last_event_id, session_id, uid)
+    with pytest.raises(LookupError):
+        registry.resume("unknown:1", "s", "u")
+    assert registry.cancel("s", "u") == 1
+    assert stream.outcome == "cancelled"
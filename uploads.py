@@ -0,0 +1,157 @@
+"""Streaming passthrough of chat file uploads to the OPB API.
+
+The /chat upload is parsed from the request stream with Werkzeug's sans-IO
+multipart decoder, so files are never spooled to memory or temp files.
+Each file goes upstream in its own ``upload_files`` call with a chunked
+multipart body. The body is fed through a small bounded pipe, so the
+browser sends no faster than the OPB API accepts. Calls run on up to
+OPB_UPLOAD_CONCURRENCY threads. While one file is being indexed upstream,
+the next one is already streaming. Each file's SHA-256 is computed on the
+way through, so its upload result can be reused when the same content is
+attached again.
+"""
+import hashlib
+import os
+import queue
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from urllib3.fields import format_multipart_header_param
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+MAX_BYTES = int(os.environ.get("OPB_UPLOAD_MAX_BYTES", 100 * 1024 * 1024))
+CONCURRENCY = int(os.environ.get("OPB_UPLOAD_CONCURRENCY", 4))
+CHUNK_SIZE = 64 * 1024
+PIPE_CHUNKS = 16
+MAX_FIELD_BYTES = 64 * 1024
+
+_END = object()
+
+
+class _Pipe:
+    """Bounded hand-off of one file's chunks from the parser to its upload thread."""
+
+    def __init__(self, size=PIPE_CHUNKS):
+        self._queue = queue.Queue(maxsize=size)
+        self.error = None
+        self.abandoned = False
+
+    def write(self, data):
+        # Once the upload has given up, the rest of the file is dropped
+        while not self.abandoned:
+            try:
+                self._queue.put(data, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def close(self, error=None):
+        if error is None:
+            self.write(_END)
+            return
+        self.error = error
+        try:
+            self._queue.put_nowait(_END)
+        except queue.Full:
+            pass
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if self.error is not None:
+                raise self.error
+            if item is _END:
+                return
+            yield item
+
+
+def multipart_body(boundary, name, filename, content_type, chunks):
+    """Yield a one-file ``multipart/form-data`` body around ``chunks``."""
+    yield (
+        f"--{boundary}\r\n"
+        f"Content-Disposition: form-data; {format_multipart_header_param('name', name)}; "
+        f"{format_multipart_header_param('filename', filename)}\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    yield from chunks
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def _upload(send, fields, filename, content_type, pipe):
+    boundary = uuid.uuid4().hex
+    try:
+        return send(
+            fields,
+            multipart_body(boundary, "files", filename, content_type, pipe),
+            f"multipart/form-data; boundary={boundary}",
+        )
+    finally:
+        pipe.abandoned = True
+
+
+def relay_files(stream, boundary, send, max_bytes=MAX_BYTES, max_workers=CONCURRENCY, chunk_size=CHUNK_SIZE):
+    """Upload each file of a multipart request body as it is read from ``stream``.
+
+    ``send(fields, body, content_type)`` makes the upstream call for one
+    file. It gets the form fields that came before the file and returns
+    the upstream JSON. Returns the form fields and a list of ``(filename,
+    sha256 hex digest, result, error)``, in upload order. Raises RequestEntityTooLarge when
+    the body exceeds ``max_bytes`` and ValueError when it is malformed.
+    """
+    decoder = MultipartDecoder(boundary.encode())
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    fields, uploads = {}, []
+    field = pipe = None
+    received = field_bytes = 0
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            received += len(chunk)
+            if received > max_bytes:
+                raise RequestEntityTooLarge(f"Uploads are limited to {max_bytes} bytes")
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, File) and event.filename:
+                    pipe = _Pipe()
+                    digest = hashlib.sha256()
+                    content_type = event.headers.get("Content-Type", "application/octet-stream")
+                    future = executor.submit(
+                        copy_context().run, _upload, send, dict(fields), event.filename, content_type, pipe
+                    )
+                    uploads.append((event.filename, digest, future))
+                elif isinstance(event, (Field, File)):
+                    field = (event.name if isinstance(event, Field) else None, [])
+                elif isinstance(event, Data):
+                    if pipe is not None:
+                        if event.data:
+                            digest.update(event.data)
+                            pipe.write(event.data)
+                        if not event.more_data:
+                            pipe.close()
+                            pipe = None
+                    else:
+                        field_bytes += len(event.data)
+                        if field_bytes > MAX_FIELD_BYTES:
+                            raise RequestEntityTooLarge(f"Form fields are limited to {MAX_FIELD_BYTES} bytes")
+                        field[1].append(event.data)
+                        if not event.more_data and field[0] is not None:
+                            fields[field[0]] = b"".join(field[1]).decode()
+                event = decoder.next_event()
+            if isinstance(event, Epilogue):
+                break
+            if not chunk:
+                raise ValueError("Upload ended before the multipart body was complete")
+    except BaseException as e:
+        if pipe is not None:
+            pipe.close(e)
+        raise
+    finally:
+        executor.shutdown(wait=False)
+    results = []
+    for filename, digest, future in uploads:
+        error = future.exception()
+        results.append((filename, digest.hexdigest(), None if error else future.result(), error))
+    return fields, results